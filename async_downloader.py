@@ -0,0 +1,345 @@
+import asyncio
+import hashlib
+import os
+import random
+from collections import deque, namedtuple
+from urllib.parse import urlsplit
+import aiohttp
+import metrics
+
+#async download engine shared by the scrapers
+#one pooled keep-alive session, bounded (optionally adaptive) concurrency, per-host rate limit,
+#retries with exponential backoff and streaming writes to disk
+
+USER_AGENT = 'Mozilla/5.0'
+CONCURRENCY = 16        #max requests in flight (the starting point when adaptive)
+MAX_IN_FLIGHT = 64      #adaptive: hard cap on requests in flight
+MIN_CONCURRENCY = 2     #adaptive: never go below this
+LATENCY_FACTOR = 2.0    #adaptive: back off once smoothed latency is this many times the best seen
+PER_HOST_RATE = 20.0    #max new requests per second per host (None = no limit)
+RETRIES = 3             #extra attempts after the first one
+BACKOFF_BASE = 0.5      #seconds, doubled every retry
+BACKOFF_MAX = 10.0
+TIMEOUT = 30            #seconds per request
+CHUNK_SIZE = 64 * 1024  #bytes per streamed write
+
+#what a download wrote: HTTP status (200, or 304 when a conditional GET found nothing new),
+#bytes written, sha256 of the body and the validators to send next time
+DownloadInfo = namedtuple("DownloadInfo", ["status", "size", "sha256", "etag", "last_modified"])
+
+#status codes worth retrying, anything else >= 400 fails straight away
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+#PIL format each saved file extension has to hold
+IMAGE_FORMATS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG"}
+
+#finalize step for the scrapers: the downloaded bytes are kept as served when they already are what the
+#file extension says, anything else (f_auto can send PNG or WebP for a .jpg URL) and palette images are
+#re-encoded as RGB in the extension's format
+def normalize_image(image_path):
+    from PIL import Image  #only the scrapers need it
+    expected = IMAGE_FORMATS.get(os.path.splitext(image_path)[1][1:].lower())
+    with Image.open(image_path) as image:  #only reads the header
+        reformat = expected is not None and image.format != expected
+        if image.mode != "P" and not reformat:
+            metrics.inc("images_passthrough")
+            return
+        image.load()
+    metrics.inc("images_reformatted" if reformat else "images_converted")
+    with metrics.timer("reencode_ms"):
+        image.convert("RGB").save(image_path, format=expected or image.format)
+
+#errors = the DownloadErrors of every candidate when none of a job's urls worked, each already names its url
+class DownloadError(Exception):
+    def __init__(self, url, message=None, status=None, errors=()):
+        self.errors = list(errors)
+        super().__init__(f"{url}: {message}" if message is not None else "; ".join(map(str, self.errors)))
+        self.url = url
+        self.status = status
+
+#spaces out request starts so no single host sees more than `rate` per second
+class HostRateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = {}
+
+    async def wait(self, host):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+#fixed number of request slots
+class FixedLimit:
+    def __init__(self, concurrency):
+        self.limit = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def acquire(self):
+        await self.semaphore.acquire()
+
+    def release(self, outcome, latency):
+        self.semaphore.release()
+
+#AIMD request slots: +1 slot per window of successful requests, halve on a 429/5xx/timeout
+#or when latency climbs well above the best seen (the CDN queueing us); at most one cut per round-trip
+class AdaptiveLimit:
+    def __init__(self, initial=CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_IN_FLIGHT,
+                 latency_factor=LATENCY_FACTOR, decrease=0.5):
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_factor = latency_factor
+        self.decrease = decrease
+        self.in_flight = 0
+        self.latency = None       #smoothed seconds per request
+        self.best_latency = None
+        self.last_cut = 0.0
+        self.waiters = deque()
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()  #woken but cancelled before it ran (e.g. a losing probe), pass the slot on
+                raise
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+        self.in_flight += 1
+
+    #outcome is "ok" (2xx, latency = time to headers), "miss" (other answers like 304/404, healthy but too cheap
+    #to say anything about latency), "throttled" (429/503), "error" (other 5xx, timeouts, connection errors)
+    #or None when the request was cancelled and says nothing about the server
+    def release(self, outcome, latency):
+        self.in_flight -= 1
+        if outcome is not None:
+            self._adjust(outcome, latency)
+        self._wake()
+
+    #wake as many waiters as there are free slots
+    def _wake(self):
+        for _ in range(int(self.limit) - self.in_flight):
+            if not self.waiters:
+                break
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _adjust(self, outcome, latency):
+        if outcome == "ok":
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.best_latency = self.latency if self.best_latency is None else min(self.best_latency, self.latency)
+        now = asyncio.get_running_loop().time()
+        if outcome == "ok":
+            congested = self.latency > self.latency_factor * self.best_latency
+        else:
+            congested = outcome != "miss"
+        if congested:
+            if now - self.last_cut > (self.latency or 0.0):
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self.last_cut = now
+                metrics.inc(f"concurrency_cut_{outcome}" if outcome != "ok" else "concurrency_cut_latency")
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        metrics.observe("http_concurrency", self.limit)
+
+class Downloader:
+    def __init__(self, concurrency=CONCURRENCY, per_host_rate=PER_HOST_RATE, retries=RETRIES,
+                 backoff_base=BACKOFF_BASE, timeout=TIMEOUT, headers=None, adaptive=False, max_in_flight=MAX_IN_FLIGHT):
+        self.concurrency = concurrency
+        self.adaptive = adaptive
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.headers = {'User-Agent': USER_AGENT, **(headers or {})}
+        self.rate_limiter = HostRateLimiter(per_host_rate)
+        self.session = None
+
+    async def __aenter__(self):
+        pool_size = self.max_in_flight if self.adaptive else self.concurrency
+        connector = aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=30, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        if self.adaptive:
+            self.limiter = AdaptiveLimit(self.concurrency, maximum=self.max_in_flight)
+        else:
+            self.limiter = FixedLimit(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        delay = min(BACKOFF_MAX, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)  #jitter so retries don't line up
+
+    #run `handler(response)` for a GET on url, retrying connection errors and retryable statuses
+    async def request(self, url, handler, headers=None):
+        host = urlsplit(url).netloc
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            retry_after = None
+            outcome = None
+            latency = 0.0
+            await self.limiter.acquire()
+            try:
+                await self.rate_limiter.wait(host)
+                metrics.inc("http_requests")
+                start = loop.time()
+                with metrics.timer("http_fetch_ms"):
+                    async with self.session.get(url, headers=headers) as response:
+                        latency = loop.time() - start  #time to headers, body size doesn't skew it
+                        metrics.inc(f"http_status_{response.status}")
+                        if response.status in (429, 503):
+                            outcome = "throttled"
+                        elif response.status >= 500:
+                            outcome = "error"
+                        if response.status < 400:
+                            result = await handler(response)
+                            outcome = "ok" if response.status < 300 else "miss"
+                            return result
+                        outcome = outcome or "miss"  #a 404 is a healthy answer as far as load goes
+                        if response.status not in RETRY_STATUSES or attempt >= self.retries:
+                            metrics.inc("http_failures")
+                            raise DownloadError(url, f"HTTP {response.status}", response.status)
+                        header = response.headers.get("Retry-After", "")
+                        retry_after = float(header) if header.isdigit() else None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                outcome = "error"
+                latency = loop.time() - start
+                metrics.inc("http_errors")
+                if attempt >= self.retries:
+                    metrics.inc("http_failures")
+                    raise DownloadError(url, f"{type(e).__name__}: {e}") from e
+            finally:
+                self.limiter.release(outcome, latency)
+            metrics.inc("http_retries")
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    #whole response body as bytes
+    async def fetch(self, url, headers=None):
+        async def read(response):
+            data = await response.read()
+            metrics.inc("http_bytes", len(data))
+            return data
+        return await self.request(url, read, headers)
+
+    #stream the body to dest_path (via a .part file so a crash never leaves a truncated image)
+    #pass If-None-Match / If-Modified-Since in headers for a conditional GET, a 304 leaves dest_path alone
+    async def download(self, url, dest_path, headers=None):
+        async def write(response):
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if response.status == 304:
+                metrics.inc("http_not_modified")
+                return DownloadInfo(304, None, None, etag, last_modified)
+            part_path = dest_path + ".part"
+            size = 0
+            digest = hashlib.sha256()
+            try:
+                with open(part_path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            except BaseException:  #failed or cancelled (a losing probe), drop the partial file
+                os.remove(part_path)
+                raise
+            os.replace(part_path, dest_path)
+            metrics.inc("http_bytes", size)
+            return DownloadInfo(response.status, size, digest.hexdigest(), etag, last_modified)
+        return await self.request(url, write, headers)
+
+    #try each (url, dest_path[, headers]) candidate in order, returns (url, dest_path, info) for the one that worked
+    #probe=True requests every candidate at once (e.g. the same image as .jpg/.jpeg/.png), so finding the
+    #right one costs one round-trip; the earliest candidate in the list that exists still wins
+    async def download_first(self, candidates, probe=False):
+        if probe and len(candidates) > 1:
+            return await self._probe(candidates)
+        errors = []
+        for url, dest_path, *headers in candidates:
+            try:
+                info = await self.download(url, dest_path, headers[0] if headers else None)
+                return url, dest_path, info
+            except DownloadError as e:
+                errors.append(e)
+        raise DownloadError(candidates[0][0] if candidates else "", errors=errors)
+
+    async def _probe(self, candidates):
+        tasks = [asyncio.ensure_future(self.download(url, dest_path, headers[0] if headers else None))
+                 for url, dest_path, *headers in candidates]
+        errors = []
+        winner = None
+        try:
+            for i, task in enumerate(tasks):  #in preference order, later ones keep running meanwhile
+                try:
+                    await task
+                    winner = i
+                    break
+                except DownloadError as e:
+                    errors.append(e)
+        finally:
+            losers = tasks if winner is None else tasks[winner + 1:]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+            for task, (_, dest_path, *_) in zip(tasks, candidates):
+                if task in losers and not task.cancelled() and task.exception() is None:
+                    os.remove(dest_path)  #a later candidate finished first, keep only the winner
+        if winner is None:
+            raise DownloadError(candidates[0][0], errors=errors)
+        return candidates[winner][0], candidates[winner][1], tasks[winner].result()
+
+#download every job, jobs = iterable of (key, [(url, dest_path[, headers]), ...])
+#jobs are pulled lazily (a generator reading a CSV works), only as many as can be in flight at once
+#finalize(dest_path) runs in a worker thread after a successful write (e.g. re-encoding)
+#on_result(key, result_or_exception) is called as each job finishes, without it the results are returned
+#probe=True races each job's candidates instead of trying them one after another
+#adaptive=True lets AdaptiveLimit tune concurrency between MIN_CONCURRENCY and max_in_flight
+async def download_all(jobs, on_result=None, finalize=None, probe=False, **settings):
+    results = {}
+    async with Downloader(**settings) as downloader:
+        async def run(key, candidates):
+            try:
+                result = await downloader.download_first(candidates, probe)
+                if finalize is not None and result[2].status != 304:
+                    try:
+                        await asyncio.to_thread(finalize, result[1])
+                    except Exception:
+                        os.remove(result[1])  #don't leave an unusable file that looks downloaded
+                        raise
+            except Exception as e:
+                result = e
+            if on_result is not None:
+                on_result(key, result)
+            else:
+                results[key] = result
+
+        jobs = iter(jobs)
+        async def worker():
+            for key, candidates in jobs:  #shared iterator, next() never yields to the loop
+                await run(key, candidates)
+
+        workers = downloader.max_in_flight if downloader.adaptive else downloader.concurrency
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    return results
+
+#blocking wrapper for scripts
+def run_downloads(jobs, on_result=None, finalize=None, probe=False, **settings):
+    return asyncio.run(download_all(jobs, on_result=on_result, finalize=finalize, probe=probe, **settings))
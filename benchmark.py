@@ -0,0 +1,299 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import numpy as np
+
+#reproducible benchmark suite
+#builds a synthetic labeled corpus (color/<label>/ layout), serves it from a local stand-in for
+#media.rallyhouse.com and times every stage separately, results go to a JSON file so runs can be compared
+#python benchmark.py [--out bench_results.json] [--per-label 50] [--stages extract fit ...]
+
+OUT_FILE = "bench_results.json"
+PER_LABEL = 50
+IMAGE_SIZE = 730
+SEED = 42
+
+#synthetic parent colors (RGB)
+LABELS = {
+    "Black": (20, 20, 20),
+    "Blue": (30, 60, 170),
+    "Gold": (210, 170, 40),
+    "Gray": (128, 128, 128),
+    "Green": (30, 120, 50),
+    "Maroon": (110, 20, 40),
+    "Orange": (240, 110, 20),
+    "Purple": (90, 40, 140),
+    "Red": (200, 30, 30),
+}
+
+STAGES = ("download_scraper", "download_raw", "extract", "fit", "predict_row", "predict_batch", "classify_colors")
+
+# === SYNTHETIC CORPUS ===
+
+#one product-like JPEG: a jittered garment shape on white, solid or striped with a second color
+def make_image(rgb, rng, size=IMAGE_SIZE):
+    import cv2
+    image = np.full((size, size, 3), 255, dtype=np.uint8)
+    bgr = np.clip(np.array(rgb[::-1]) + rng.normal(0, 12, 3), 0, 255).astype(np.uint8)
+    margin = int(size * rng.uniform(0.15, 0.25))
+    body = (margin, margin + size // 10, size - margin, size - margin)
+    cv2.rectangle(image, body[:2], body[2:], bgr.tolist(), -1)
+    #sleeves
+    cv2.rectangle(image, (margin // 3, margin + size // 10), (margin, size // 2), bgr.tolist(), -1)
+    cv2.rectangle(image, (size - margin, margin + size // 10), (size - margin // 3, size // 2), bgr.tolist(), -1)
+    if rng.random() < 0.4:
+        accent = rng.integers(0, 256, 3).tolist()
+        for y in range(body[1], body[3], size // 12):
+            cv2.rectangle(image, (body[0], y), (body[2], y + size // 40), accent, -1)
+    if rng.random() < 0.5:  #a logo in the middle
+        cv2.circle(image, (size // 2, size // 2), size // 10, rng.integers(0, 256, 3).tolist(), -1)
+    return image
+
+#writes per_label images into root/<label>/, returns (paths, labels)
+def make_corpus(root, per_label=PER_LABEL, seed=SEED, size=IMAGE_SIZE):
+    import cv2
+    rng = np.random.default_rng(seed)
+    paths, labels = [], []
+    for label, rgb in LABELS.items():
+        folder = os.path.join(root, label)
+        os.makedirs(folder, exist_ok=True)
+        for i in range(per_label):
+            path = os.path.join(folder, f"{label.lower()}{i:05d}.jpg")
+            cv2.imwrite(path, make_image(rgb, rng, size), [cv2.IMWRITE_JPEG_QUALITY, 90])
+            paths.append(path)
+            labels.append(label)
+    return paths, labels
+
+# === LOCAL CDN STUB ===
+
+#serves /homepage/<name>-1.<ext> from a {name: file path} dict, ignoring the query string
+class CDNHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        name, _, ext = os.path.basename(path).rpartition(".")
+        source = self.server.images.get(name[:-2] if name.endswith("-1") else name)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not path.startswith("/homepage/") or source is None or ext not in ("jpg", "jpeg"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with open(source, "rb") as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class CDNStub:
+    def __init__(self, images, latency_ms=0.0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), CDNHandler)
+        self.server.daemon_threads = True
+        self.server.images = images
+        self.server.latency = latency_ms / 1000.0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    #same URL scheme as the scrapers' BASE_URL
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/homepage/{{}}-1.jpg?tx=f_auto,c_fit,w_730,h_730"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+# === STAGES ===
+
+def _timed(func, repeat=1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  #the scripts print per item
+            result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def _record(results, stage, seconds, items, **extra):
+    results[stage] = {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "per_item_ms": round(1000.0 * seconds / items, 4) if items else None,
+        **extra,
+    }
+    print(f"{stage:<18}{seconds:>10.3f}s  {items} items")
+
+@contextlib.contextmanager
+def _working_dir(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def bench_download_scraper(results, workdir, names, base_url):
+    import pandas as pd
+    import scraper
+    run_dir = os.path.join(workdir, "scraper")
+    os.makedirs(run_dir, exist_ok=True)
+    csv_path = os.path.join(run_dir, "images.csv")
+    pd.DataFrame({"Name": names}).to_csv(csv_path, index=False)
+    seconds, _ = _timed(lambda: scraper.main(csv_path, os.path.join(run_dir, "images"), base_url))
+    _record(results, "download_scraper", seconds, len(names))
+
+def bench_download_raw(results, workdir, names, base_url):
+    import pandas as pd
+    import scraper_raw_multithread
+    run_dir = os.path.join(workdir, "raw")
+    os.makedirs(run_dir, exist_ok=True)
+    pd.DataFrame({"Name": names, "Picture ID": names}).to_csv(os.path.join(run_dir, "Color Import.csv"), index=False)
+    with _working_dir(run_dir):  #it writes to_tag_images/ and its logs next to the CSV
+        seconds, _ = _timed(lambda: scraper_raw_multithread.main("Color Import.csv", base_url))
+    _record(results, "download_raw", seconds, len(names))
+
+def bench_extract(results, paths, workers):
+    from features import extract_features_parallel
+    single, _ = _timed(lambda: extract_features_parallel(paths, "nw", workers=1))
+    seconds, x = _timed(lambda: extract_features_parallel(paths, "nw", workers=workers))
+    _record(results, "extract", seconds, len(paths), single_process_seconds=round(single, 4))
+    return x
+
+def bench_fit(results, x, y):
+    from sklearn.neighbors import KNeighborsClassifier
+    seconds, knn = _timed(lambda: KNeighborsClassifier(n_neighbors=9).fit(x, y), repeat=3)
+    _record(results, "fit", seconds, len(x))
+    return knn
+
+def bench_predict(results, knn, x, stages):
+    from inference import predict_batch
+    if "predict_row" in stages:
+        seconds, _ = _timed(lambda: [knn.predict([row])[0] for row in x])
+        _record(results, "predict_row", seconds, len(x))
+    if "predict_batch" in stages:
+        seconds, _ = _timed(lambda: predict_batch(knn, x), repeat=3)
+        _record(results, "predict_batch", seconds, len(x))
+
+#synthetic team CSVs: every team has a few parent colors, input rows mix exact, fuzzy, unmapped and blank
+def make_team_csvs(workdir, rows, teams=50, seed=SEED):
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    colors = list(LABELS)
+    reference = []
+    for t in range(teams):
+        for color in rng.choice(colors, size=5, replace=False):
+            reference.append({"Team": f"Team {t}", "Parent Color Primary": color.upper(),
+                              "Item Name Color Primary": f"{color} {t}"})
+    mapping = [{"Color List": f"{color.upper()}/{n}", "New Color": color.upper()}
+               for color in colors for n in range(20)]
+    mapping += [{"Color List": f"{color.upper()}ISH", "New Color": color.upper() + "S"} for color in colors]
+    choices = [m["Color List"] for m in mapping] + ["NOT MAPPED", ""]
+    inputs = [{"Name": f"SKU{i:07d}", "Team": f"Team {rng.integers(teams)}",
+               "Color List": choices[rng.integers(len(choices))]} for i in range(rows)]
+
+    paths = {}
+    for name, data in (("input", inputs), ("reference", reference), ("mapping", mapping)):
+        paths[name] = os.path.join(workdir, f"{name}.csv")
+        pd.DataFrame(data).to_csv(paths[name], index=False)
+    return paths
+
+def bench_classify_colors(results, workdir, rows):
+    import team_color_classifier
+    paths = make_team_csvs(workdir, rows)
+    output, log = os.path.join(workdir, "team_output.csv"), os.path.join(workdir, "team_log.csv")
+    #no fuzzy cache, so every repeat and every run is cold and the timings compare across runs;
+    #the warm figure uses a cache inside workdir, never the user's fuzzy_cache.json
+    seconds, _ = _timed(lambda: team_color_classifier.classify_colors(
+        paths["input"], paths["reference"], paths["mapping"], output, log, fuzzy_cache=None))
+    cache = os.path.join(workdir, "fuzzy_cache.json")
+    _timed(lambda: team_color_classifier.classify_colors(
+        paths["input"], paths["reference"], paths["mapping"], output, log, fuzzy_cache=cache))
+    warm, _ = _timed(lambda: team_color_classifier.classify_colors(
+        paths["input"], paths["reference"], paths["mapping"], output, log, fuzzy_cache=cache))
+    _record(results, "classify_colors", seconds, rows, warm_cache_seconds=round(warm, 4))
+
+# === RUNNER ===
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def run(stages=STAGES, per_label=PER_LABEL, team_rows=20000, latency_ms=0.0, workers=None, out_file=OUT_FILE):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="color_bench_") as workdir:
+        paths, labels = make_corpus(os.path.join(workdir, "color"), per_label)
+        names = [os.path.basename(p).rsplit(".", 1)[0] for p in paths]
+
+        if "download_scraper" in stages or "download_raw" in stages:
+            with CDNStub(dict(zip(names, paths)), latency_ms) as cdn:
+                if "download_scraper" in stages:
+                    bench_download_scraper(results, workdir, names, cdn.base_url)
+                if "download_raw" in stages:
+                    bench_download_raw(results, workdir, names, cdn.base_url)
+
+        needs_features = {"extract", "fit", "predict_row", "predict_batch"} & set(stages)
+        if needs_features:
+            x = bench_extract(results, paths, workers)
+            knn = bench_fit(results, x, np.array(labels))
+            bench_predict(results, knn, x, stages)
+            if "extract" not in stages:
+                results.pop("extract")
+            if "fit" not in stages:
+                results.pop("fit")
+
+        if "classify_colors" in stages:
+            bench_classify_colors(results, workdir, team_rows)
+
+    report = {
+        "environment": _environment(),
+        "settings": {"per_label": per_label, "images": len(LABELS) * per_label, "team_rows": team_rows,
+                     "latency_ms": latency_ms, "workers": workers},
+        "stages": results,
+    }
+    with open(out_file, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out_file}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every stage of the color pipeline on synthetic data")
+    parser.add_argument("--out", default=OUT_FILE)
+    parser.add_argument("--per-label", type=int, default=PER_LABEL, help="synthetic images per color")
+    parser.add_argument("--team-rows", type=int, default=20000, help="rows in the synthetic team CSV")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added delay per CDN stub request")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    args = parser.parse_args()
+    run(args.stages, args.per_label, args.team_rows, args.latency_ms, args.workers, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,77 @@
-import cv2
-import os
 import numpy as np
+import joblib
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.model_selection import train_test_split
+from features import extract_features_parallel, list_labeled_images
+from feature_store import cached_features
+from condense import condense_model, condense_report
+from model_format import save_sklearn_model
+import metrics
 
 #number of colors to classify
 n = 9
 
-#how to calc mean image color
-def extract_color_features(image_path):
-    image = cv2.imread(image_path)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) #RGB conversion func
-    mean_color = np.mean(image, axis=(0, 1)) #mean the color values
-    return mean_color
-
-#calc mean color without white pixels
-def extract_color_features_nw(image_path):
-    image = cv2.imread(image_path)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)  #convert to RGB
+#how to calc the image color, see FEATURES in features.py
+#"mean" = average color, "nw" = average color without white, "center" = central pixel, "hist" = coarse histogram
+#a tuple like ("nw", "center") combines features from one decode
+FEATURE_METHOD = "nw"
 
-    #create a mask for non-white pixels
-    mask = ~(np.all(image == [255, 255, 255], axis=-1))
+#JPEG decode scale (1, 2, 4 or 8), saved with the model so whatcolor.py decodes the same way
+DECODE_SCALE = 1
 
-    #extract non-white pixels to mask
-    non_white_pixels = image[mask]
-
-    #compute mean color
-    if len(non_white_pixels) > 0:
-        mean_color = np.mean(non_white_pixels, axis=0)
-    else:
-        mean_color = [0, 0, 0]  #default to black if no valid pixels
+#feature extraction processes (None = one per core, 1 = single process)
+WORKERS = None
 
-    return mean_color
+#reuse features from feature_cache/ so a retrain only decodes new or changed images
+USE_FEATURE_CACHE = True
 
-#how to get central pixel color value
-def get_center_pixel_color(image_path):
-    image = cv2.imread(image_path) 
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+#shrink the model after training: None, "cnn", "enn", "enn+cnn" or "kmeans" (see condense.py)
+CONDENSE = None
 
-    height, width, _ = image.shape
-    center_x, center_y = width // 2, height // 2 
-
-    center_pixel = image[center_y, center_x]
-    return center_pixel
-
-#ONLY CHOOSE ONE OF THE ABOVE METHODS (just func defs up here though)
+#where the model is saved: a mapped model directory (fast to load, see model_format.py)
+#plus the old joblib pickle for anything still loading that
+MODEL_DIR = "gray_model"
+MODEL_PKL = "gray_model.pkl"
 
 #define where data is coming from
-data_path = "color/" #folder named img with folders of colors
-x = []
-y = []
-
-#gather test data from the directory of images
-for color_label in os.listdir(data_path):
-    folder_path = os.path.join(data_path, color_label)
-    if not os.path.isdir(folder_path):  #skip non-foldered files
-        continue
-    
-    for img_file in os.listdir(folder_path):
-        img_path = os.path.join(folder_path, img_file)
-        center_color = extract_color_features_nw(img_path) #Where to choose what center color method to use
-        x.append(center_color)
-        y.append(color_label)
-
-x = np.array(x)
-y = np.array(y)
-
-#split data into test and validation datasets
-X_train, X_test, y_train, y_test = train_test_split(x, y, test_size=0.1, random_state=42)
-
-knn = KNeighborsClassifier(n_neighbors=n)  #set to train using n neighbors
-knn.fit(X_train, y_train) #actually train the model
-
-#saving the model
-import joblib
-
-# Save the trained model to a file
-joblib.dump(knn, "gray_model.pkl")
-print("Model saved successfully!")
+data_path = "color/" #folder named color with folders of colors
+
+def main(data_path=data_path, feature_method=FEATURE_METHOD, decode_scale=DECODE_SCALE,
+         workers=WORKERS, condense=CONDENSE, model_dir=MODEL_DIR, model_pkl=MODEL_PKL):
+    #gather test data from the directory of images
+    paths, labels = list_labeled_images(data_path)
+    if USE_FEATURE_CACHE:
+        x = cached_features(paths, feature_method, workers=workers, scale=decode_scale)
+    else:
+        x = extract_features_parallel(paths, feature_method, workers=workers, scale=decode_scale)
+    y = np.array(labels)
+
+    #split data into test and validation datasets
+    #(the paths are split along so the model only records the training images as seen)
+    X_train, X_test, y_train, y_test, paths_train, _ = train_test_split(
+        x, y, np.array(paths, dtype=object), test_size=0.1, random_state=42)
+
+    knn = KNeighborsClassifier(n_neighbors=n)  #set to train using n neighbors
+    knn.fit(X_train, y_train) #actually train the model
+
+    #record how the features were made so inference can match it
+    knn.feature_method_ = feature_method
+    knn.decode_scale_ = decode_scale
+
+    #optionally keep only the prototypes near the color boundaries, checked on the held-out split
+    if condense:
+        condensed = condense_model(knn, X_train, y_train, condense)
+        report = condense_report(knn, condensed, X_test, y_test)
+        print(f"Condensed with {condense}: " + ", ".join(f"{k}={v}" for k, v in report.items()))
+        knn = condensed
+
+    # Save the trained model to a file
+    #held-out images aren't in the model, leaving them out of sources lets incremental.py add them later
+    meta = save_sklearn_model(knn, model_dir, sources=paths_train.tolist(), n_test=len(y_test))
+    joblib.dump(knn, model_pkl)
+    print(f"Model saved successfully! ({model_dir}/, data hash {meta['data_hash'][:12]})")
+    metrics.report()
+
+#guarded so the extraction worker processes can import this file safely
+if __name__ == "__main__":
+    main()
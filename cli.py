@@ -0,0 +1,185 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+#single entry point for the project: python cli.py <subcommand> ...
+#heavy dependencies (cv2, sklearn, pandas, pygame, aiohttp, fuzzywuzzy) are only imported
+#inside the subcommand that needs them, so --help and small runs start fast
+
+SUBCOMMANDS = ("scrape", "train", "predict", "classify-team", "tag")
+
+#the module each subcommand ends up importing, for the startup report
+SUBCOMMAND_MODULES = {
+    "scrape": "scraper",
+    "train": "classifier",
+    "predict": "whatcolor",
+    "classify-team": "team_color_classifier",
+    "tag": "swiper_pick",
+}
+
+def cmd_scrape(args):
+    if args.raw:
+        import scraper_raw_multithread
+        scraper_raw_multithread.main(args.csv or scraper_raw_multithread.CSV_FILE,
+                                     args.base_url or scraper_raw_multithread.BASE_URL)
+    else:
+        import scraper
+        scraper.main(args.csv or scraper.CSV_FILE, scraper.FOLDER_NAME,
+                     args.base_url or scraper.BASE_URL)
+
+def cmd_train(args):
+    if args.incremental:
+        import incremental
+        new_dir, added = incremental.incremental_update(args.model, data_path=args.data, workers=args.workers)
+        if added and args.promote:
+            incremental.promote(args.model, new_dir)
+        return
+    import classifier
+    classifier.main(
+        data_path=args.data,
+        feature_method=args.method.split("+") if "+" in args.method else args.method,
+        decode_scale=args.scale,
+        workers=args.workers,
+        condense=args.condense,
+        model_dir=args.model,
+        model_pkl=args.model_pkl or f"{args.model.rstrip('/')}.pkl",  #never the default pickle for another --model
+    )
+
+def cmd_predict(args):
+    import numpy as np
+    import metrics
+    from features import extract_features, model_feature_settings
+    from model_format import load_model
+    from whatcolor import predict_labels, process_images_from_folder
+    model = load_model(args.model)
+
+    if args.folder:
+        process_images_from_folder(args.folder, model, args.output)
+    elif args.rgb:
+        features = np.array([[float(v) for v in rgb.split(",")] for rgb in args.rgb])
+        for rgb, label in zip(args.rgb, predict_labels(model, features)):
+            print(f"{rgb}: {label}")
+    else:
+        method, scale = model_feature_settings(model)
+        features = np.array([extract_features(path, method, scale) for path in args.images])
+        for path, label in zip(args.images, predict_labels(model, features)):
+            print(f"{path}: {label}")
+    metrics.report()
+
+def cmd_classify_team(args):
+    import glob
+    import team_color_classifier
+    if os.path.isdir(args.input) or glob.has_magic(args.input):
+        team_color_classifier.classify_batch(args.input, args.reference, args.mapping,
+                                             output_dir=args.output_dir, workers=args.workers)
+        return
+    temp = args.input.replace(".csv", "")
+    output, log = args.output or f"{temp}_output.csv", args.log or f"{temp}_log.csv"
+    if args.stream:
+        team_color_classifier.classify_colors_streaming(
+            args.input, args.reference, args.mapping, output, log,
+            chunk_rows=args.chunk_rows, workers=args.workers,
+        )
+    else:
+        team_color_classifier.classify_colors(args.input, args.reference, args.mapping, output, log)
+
+def cmd_tag(args):
+    import swiper_pick
+    swiper_pick.main(args.model)
+
+#time `cli.py <sub> --help` and importing each subcommand's module in a fresh interpreter
+def cmd_startup(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    cli = os.path.join(here, "cli.py")
+
+    def best_of(command):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = subprocess.run(command, cwd=here, capture_output=True)
+            best = min(best, time.perf_counter() - start)
+        return best, result.returncode
+
+    baseline, _ = best_of([sys.executable, "-c", "pass"])
+    print(f"{'subcommand':<15}{'--help ms':>12}{'import ms':>12}")
+    print(f"{'(python)':<15}{baseline * 1000:>12.1f}{'':>12}")
+    for name in SUBCOMMANDS:
+        help_time, _ = best_of([sys.executable, cli, name, "--help"])
+        import_time, code = best_of([sys.executable, "-c", f"import {SUBCOMMAND_MODULES[name]}"])
+        import_ms = f"{import_time * 1000:.1f}" if code == 0 else "failed"
+        print(f"{name:<15}{help_time * 1000:>12.1f}{import_ms:>12}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Rally House color classifier")
+    parser.add_argument("--timing", action="store_true", help="print how long the subcommand took")
+    parser.add_argument("--metrics", nargs="?", const="", metavar="FILE",
+                        help="collect stage timers/counters, print them at the end and optionally write FILE")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scrape", help="download product images")
+    p.add_argument("--raw", action="store_true", help="use scraper_raw_multithread (Color Import.csv -> to_tag_images/)")
+    p.add_argument("--csv", help="input CSV (default depends on the scraper)")
+    p.add_argument("--base-url", help="image URL template, e.g. a local test server")
+    p.set_defaults(func=cmd_scrape)
+
+    p = sub.add_parser("train", help="train the KNN on color/<label>/ images")
+    p.add_argument("--data", default="color/")
+    p.add_argument("--method", default="nw", help="feature(s), e.g. nw, mean, center or nw+hist")
+    p.add_argument("--scale", type=int, default=1, choices=(1, 2, 4, 8), help="JPEG decode scale")
+    p.add_argument("--workers", type=int, default=None, help="extraction processes")
+    p.add_argument("--condense", default=None, help="cnn, enn, enn+cnn or kmeans")
+    p.add_argument("--model", default="gray_model", help="model directory to write")
+    p.add_argument("--model-pkl", help="joblib pickle to write as well (default <model>.pkl)")
+    p.add_argument("--incremental", action="store_true",
+                   help="only add new color/ files and swiper_pick tags to the existing --model")
+    p.add_argument("--promote", action="store_true", help="with --incremental, make the new version current")
+    p.set_defaults(func=cmd_train)
+
+    p = sub.add_parser("predict", help="predict colors for images or RGB values")
+    p.add_argument("images", nargs="*", help="image files")
+    p.add_argument("--model", default="gray_model", help="model directory, pickle or lut table")
+    p.add_argument("--folder", help="predict every jpg in a folder and write --output")
+    p.add_argument("--output", default="gray_predictions.csv")
+    p.add_argument("--rgb", nargs="+", help="RGB values like 120,30,40")
+    p.set_defaults(func=cmd_predict)
+
+    p = sub.add_parser("classify-team", help="map Color List values to team parent colors")
+    p.add_argument("input", help="team CSV, e.g. iowa_state_test.csv, or a directory / quoted glob of them")
+    p.add_argument("--reference", default="BuyerParentColorView.csv")
+    p.add_argument("--mapping", default="ColorMappingList.csv")
+    p.add_argument("--output")
+    p.add_argument("--log")
+    p.add_argument("--stream", action="store_true",
+                   help="chunked, resumable mode for whole-catalog inputs (reads every column as text)")
+    p.add_argument("--chunk-rows", type=int, default=50000, help="with --stream, input rows per chunk")
+    p.add_argument("--workers", type=int, default=None,
+                   help="with --stream or several input files, worker processes (1 = no pool)")
+    p.add_argument("--output-dir", help="with several input files, where the _output/_log CSVs go (default next to each input)")
+    p.set_defaults(func=cmd_classify_team)
+
+    p = sub.add_parser("tag", help="open the swiper_pick tagging window")
+    p.add_argument("--model", default="gray_model", help="model that ranks each team's colors (missing = CSV order)")
+    p.set_defaults(func=cmd_tag)
+
+    p = sub.add_parser("startup", help="measure startup time of every subcommand")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=cmd_startup)
+    return parser
+
+def main(argv=None):
+    start = time.perf_counter()
+    args = build_parser().parse_args(argv)
+    if args.metrics is not None:
+        import metrics
+        metrics.enable()
+        if args.metrics:
+            metrics.METRICS_FILE = args.metrics
+    args.func(args)
+    if args.timing:
+        print(f"[{args.command}] {time.perf_counter() - start:.3f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import time
+import numpy as np
+from sklearn.base import clone
+from sklearn.cluster import KMeans
+from sklearn.neighbors import BallTree, KNeighborsClassifier
+
+#training-set condensation: keep only the points the KNN needs near the color boundaries
+#"cnn"        Hart's condensed nearest neighbors
+#"enn"        Wilson's edited nearest neighbors (drops noisy points, doesn't shrink much on its own)
+#"enn+cnn"    edit first, then condense
+#"kmeans"     per-label k-means centers as prototypes
+
+METHODS = ("cnn", "enn", "enn+cnn", "kmeans")
+
+#points checked against the prototypes before the tree is rebuilt
+CNN_BLOCK = 512
+CNN_MAX_PASSES = 10
+ENN_NEIGHBORS = 3
+KMEANS_PROTOTYPES = 32  #max centers per label
+
+#methods whose output is a sparse set of prototypes that only 1-NN reproduces the boundary with,
+#a k-vote over them would let the far side of a boundary outvote the nearest prototype
+PROTOTYPE_METHODS = ("cnn", "enn+cnn", "kmeans")
+
+#indices of points whose k nearest other points mostly agree with their label
+def edited_nearest_neighbors(X, y, k=ENN_NEIGHBORS):
+    knn = KNeighborsClassifier(n_neighbors=k).fit(X, y)
+    _, neighbors = knn.kneighbors(X, n_neighbors=k + 1)
+    neighbor_labels = y[neighbors[:, 1:]]  #first neighbor is the point itself
+    agree = (neighbor_labels == y[:, None]).sum(axis=1)
+    return np.flatnonzero(agree * 2 > k)
+
+#indices of a subset that 1-NN classifies the whole training set with
+def condensed_nearest_neighbors(X, y, random_state=42, block=CNN_BLOCK, max_passes=CNN_MAX_PASSES):
+    order = np.random.default_rng(random_state).permutation(len(X))
+    keep = np.zeros(len(X), dtype=bool)
+    #seed with one point per label
+    _, first = np.unique(y[order], return_index=True)
+    keep[order[first]] = True
+
+    for _ in range(max_passes):
+        added = 0
+        for start in range(0, len(order), block):
+            candidates = order[start:start + block]
+            candidates = candidates[~keep[candidates]]
+            if len(candidates) == 0:
+                continue
+            prototypes = np.flatnonzero(keep)
+            _, nearest = BallTree(X[prototypes]).query(X[candidates], k=1)
+            wrong = candidates[y[prototypes[nearest[:, 0]]] != y[candidates]]
+            keep[wrong] = True
+            added += len(wrong)
+        if added == 0:  #every point is absorbed
+            break
+    return np.flatnonzero(keep)
+
+#per-label k-means centers, returns (prototypes, labels)
+def kmeans_prototypes(X, y, per_label=KMEANS_PROTOTYPES, random_state=42):
+    prototypes = []
+    labels = []
+    for label in np.unique(y):
+        points = X[y == label]
+        k = min(per_label, len(points))
+        centers = KMeans(n_clusters=k, n_init=3, random_state=random_state).fit(points).cluster_centers_
+        prototypes.append(centers.astype(X.dtype))
+        labels.extend([label] * k)
+    return np.vstack(prototypes), np.array(labels)
+
+#condensed (X, y) for one of METHODS
+def condense(X, y, method):
+    X = np.asarray(X)
+    y = np.asarray(y)
+    if method == "kmeans":
+        return kmeans_prototypes(X, y)
+    if method not in METHODS:
+        raise ValueError(f"Unknown condensation method '{method}', expected one of {METHODS}")
+    idx = np.arange(len(X))
+    if method.startswith("enn"):
+        idx = edited_nearest_neighbors(X, y)
+    if method.endswith("cnn"):
+        idx = idx[condensed_nearest_neighbors(X[idx], y[idx])]
+    return X[idx], y[idx]
+
+#refit a copy of the model on the condensed training set (1-NN for PROTOTYPE_METHODS)
+def condense_model(knn, X_train, y_train, method):
+    Xc, yc = condense(X_train, y_train, method)
+    small = clone(knn)
+    k = 1 if method in PROTOTYPE_METHODS else knn.n_neighbors
+    small.set_params(n_neighbors=min(k, len(Xc)))
+    small.fit(Xc, yc)
+    for attr in ("feature_method_", "decode_scale_"):
+        if hasattr(knn, attr):
+            setattr(small, attr, getattr(knn, attr))
+    return small
+
+def _timed_predict(model, X, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predicted = model.predict(X)
+        best = min(best, time.perf_counter() - start)
+    return predicted, best
+
+#compression, query speedup and accuracy change on a held-out split
+def condense_report(full, small, X_test, y_test):
+    full_pred, full_time = _timed_predict(full, X_test)
+    small_pred, small_time = _timed_predict(small, X_test)
+    full_acc = np.mean(full_pred == y_test) if len(y_test) else 0.0
+    small_acc = np.mean(small_pred == y_test) if len(y_test) else 0.0
+    return {
+        "train_points": full.n_samples_fit_,
+        "kept_points": small.n_samples_fit_,
+        "k_full": full.n_neighbors,
+        "k_condensed": small.n_neighbors,
+        "compression": round(full.n_samples_fit_ / max(small.n_samples_fit_, 1), 2),
+        "query_speedup": round(full_time / small_time, 2) if small_time else float("inf"),
+        "accuracy_full_pct": round(100.0 * full_acc, 2),
+        "accuracy_condensed_pct": round(100.0 * small_acc, 2),
+        "accuracy_change_pct": round(100.0 * (small_acc - full_acc), 2),
+    }
@@ -1,4 +1,5 @@
-import cv2
+import asyncio
+import csv
 import numpy as np
 import pandas as pd
 from sklearn.neighbors import KNeighborsClassifier
@@ -6,7 +7,12 @@ import joblib  # For saving and loading the model
 import os  # To check if the model file exists
 import requests  # For downloading images
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
+from async_downloader import Downloader, DownloadError
+from features import decode_rgb, mean_color_nw, model_feature_settings
+from inference import predict_batch
+import metrics
 
 # Number of neighbors to use for KNN
 n = 1  # Set to 1 since we want the closest match
@@ -17,31 +23,23 @@ BASE_URL = 'https://media.rallyhouse.com/homepage/{}-1.jpg?tx=f_auto,c_fit,w_730
 # Path to save/load the trained model
 model_path = "knn_model.joblib"
 
-# Function to calculate mean color without white pixels
-def extract_color_features_nw(image):
-    image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)  # Convert PIL image to OpenCV format
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)  # Convert to RGB
+# JPEG decode scale used when training (1, 2, 4 or 8), testing reads it back from the model
+DECODE_SCALE = 1
 
-    # Create a mask for non-white pixels
-    mask = ~(np.all(image == [255, 255, 255], axis=-1))
+# Function to calculate mean color without white pixels on downloaded image bytes
+def extract_color_features_nw(data, scale=DECODE_SCALE):
+    try:
+        image = decode_rgb(data, scale)
+    except ValueError:
+        # Formats OpenCV can't decode go through PIL at full size
+        image = np.asarray(Image.open(BytesIO(data)).convert("RGB"))
+    return mean_color_nw(image)
 
-    # Extract non-white pixels using the mask
-    non_white_pixels = image[mask]
-
-    # Compute mean color
-    if len(non_white_pixels) > 0:
-        mean_color = np.mean(non_white_pixels, axis=0)
-    else:
-        mean_color = [0, 0, 0]  # Default to black if no valid pixels
-
-    return mean_color
-
-# Function to download an image from a URL
+# Function to download an image from a URL, returns the encoded bytes
 def download_image(url):
     response = requests.get(url)
     if response.status_code == 200:
-        image = Image.open(BytesIO(response.content))
-        return image
+        return response.content
     else:
         raise Exception(f"Failed to download image from {url}")
 
@@ -74,7 +72,7 @@ def train_model(csv_path):
                 continue  # Skip this row if both attempts fail
 
         # Extract color features
-        mean_color = extract_color_features_nw(image)
+        mean_color = extract_color_features_nw(image, DECODE_SCALE)
 
         # Append features and label
         x.append(mean_color)
@@ -87,11 +85,144 @@ def train_model(csv_path):
     # Initialize the KNN classifier
     knn = KNeighborsClassifier(n_neighbors=n)
     knn.fit(x, y)  # Train the model using the extracted features
+    knn.feature_method_ = "nw"
+    knn.decode_scale_ = DECODE_SCALE
 
     # Save the trained model to a file
     joblib.dump(knn, model_path)
     print("Trained and saved the KNN model to file.")
 
+# Pipeline settings for test_model: download -> extract -> predict run as concurrent stages
+FETCH_WORKERS = 16      # Concurrent downloads
+EXTRACT_WORKERS = None  # Decode/extract processes (None = one per core)
+PREDICT_BATCH = 256     # Max rows per predict_batch call
+QUEUE_SIZE = 256        # Max items waiting between two stages
+MAX_IN_FLIGHT = 1024    # Max rows read but not yet written, keeps memory flat
+READ_CHUNK = 1000       # Rows read from the test CSV at a time
+
+OUTPUT_COLUMNS = ["Name", "Original Color List", "PredictedColor"]
+
+# Same cell formatting DataFrame.to_csv used (NaN -> empty)
+def _csv_value(value):
+    return "" if pd.isna(value) else value
+
+# Stage 1: stream rows out of the test CSV
+async def _read_rows(test_csv_path, fetch_queue, window):
+    seq = 0
+    for chunk in pd.read_csv(test_csv_path, chunksize=READ_CHUNK):
+        for name, picture_id, color_list in zip(chunk['Name'], chunk['Picture ID'], chunk['Color List']):
+            await window.acquire()  # Released once the row is written
+            await fetch_queue.put((seq, name, picture_id, color_list))
+            seq += 1
+            metrics.inc("rows_read")
+
+# Stage 2: download, trying Name first and falling back to Picture ID
+async def _fetch_images(downloader, fetch_queue, extract_queue):
+    while (item := await fetch_queue.get()) is not None:
+        seq, name, picture_id, color_list = item
+        data = None
+        try:
+            data = await downloader.fetch(BASE_URL.format(name))
+        except DownloadError as e1:
+            print(f"Failed to download image using Name {name}: {e1}")
+            try:
+                data = await downloader.fetch(BASE_URL.format(picture_id))
+            except DownloadError as e2:
+                print(f"Failed to download image using PictureID {picture_id}: {e2}")
+                metrics.inc("download_failures")
+        await extract_queue.put((seq, name, color_list, data))
+
+# Stage 3: decode and extract features in worker processes
+async def _extract_images(pool, scale, extract_queue, predict_queue):
+    loop = asyncio.get_running_loop()
+    while (item := await extract_queue.get()) is not None:
+        seq, name, color_list, data = item
+        features = None
+        if data is not None:
+            try:
+                with metrics.timer("decode_extract_ms"):
+                    features = await loop.run_in_executor(pool, extract_color_features_nw, data, scale)
+            except Exception as e:
+                print(f"Failed to decode image for {name}: {e}")
+                metrics.inc("decode_failures")
+        await predict_queue.put((seq, name, color_list, features))
+
+# Stage 4: batch predictions (one kneighbors pass per batch) and write rows back out in input order
+async def _predict_and_write(knn, predict_queue, writer, window):
+    loop = asyncio.get_running_loop()
+    finished = {}  # seq -> output row, waiting for earlier rows
+    next_seq = 0
+    done = False
+    while not done:
+        batch = [await predict_queue.get()]
+        while len(batch) < PREDICT_BATCH and not predict_queue.empty():
+            batch.append(predict_queue.get_nowait())
+        if batch[-1] is None:
+            batch.pop()
+            done = True
+
+        ready = [item for item in batch if item[3] is not None]
+        predicted = []
+        if ready:
+            x = np.array([item[3] for item in ready])
+            with metrics.timer("predict_batch_ms"):
+                prediction = await loop.run_in_executor(None, predict_batch, knn, x, PREDICT_BATCH)
+            metrics.inc("predictions", len(ready))
+            metrics.observe("predict_batch_rows", len(ready))
+            predicted = prediction.labels
+        predicted_by_seq = {item[0]: color for item, color in zip(ready, predicted)}
+
+        for seq, name, color_list, _ in batch:
+            predicted_color = predicted_by_seq.get(seq, "Error")
+            if seq in predicted_by_seq:
+                print(f"Predicted color for {name}: {predicted_color}")
+            finished[seq] = [_csv_value(name), _csv_value(color_list), predicted_color]
+
+        while next_seq in finished:
+            writer.writerow(finished.pop(next_seq))
+            window.release()
+            next_seq += 1
+
+async def _run_test_pipeline(knn, scale, test_csv_path, output_file):
+    writer = csv.writer(output_file)
+    writer.writerow(OUTPUT_COLUMNS)
+
+    window = asyncio.Semaphore(MAX_IN_FLIGHT)
+    fetch_queue = asyncio.Queue(QUEUE_SIZE)
+    extract_queue = asyncio.Queue(QUEUE_SIZE)
+    predict_queue = asyncio.Queue(QUEUE_SIZE)
+
+    with ProcessPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+        async with Downloader(concurrency=FETCH_WORKERS) as downloader:
+            extract_count = (EXTRACT_WORKERS or os.cpu_count() or 1) * 2  # Keep every process busy
+            fetchers = [asyncio.create_task(_fetch_images(downloader, fetch_queue, extract_queue))
+                        for _ in range(FETCH_WORKERS)]
+            extractors = [asyncio.create_task(_extract_images(pool, scale, extract_queue, predict_queue))
+                          for _ in range(extract_count)]
+            predictor = asyncio.create_task(_predict_and_write(knn, predict_queue, writer, window))
+
+            # Shut each stage down once everything upstream of it has drained
+            async def feed():
+                await _read_rows(test_csv_path, fetch_queue, window)
+                for _ in fetchers:
+                    await fetch_queue.put(None)
+                await asyncio.gather(*fetchers)
+                for _ in extractors:
+                    await extract_queue.put(None)
+                await asyncio.gather(*extractors)
+                await predict_queue.put(None)
+                await predictor
+
+            # If any stage dies the window is never released and the reader would wait forever,
+            # so cancel the rest and raise that stage's error
+            stages = [asyncio.create_task(feed()), *fetchers, *extractors, predictor]
+            done, pending = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in done:
+                task.result()
+
 # Function to test the model
 def test_model(test_csv_path, output_csv_path):
     # Load the trained model
@@ -100,55 +231,13 @@ def test_model(test_csv_path, output_csv_path):
 
     knn = joblib.load(model_path)
     print("Loaded the KNN model from file.")
+    _, scale = model_feature_settings(knn)
 
-    # Load test data from a CSV file
-    test_data = pd.read_csv(test_csv_path)
-
-    # Columns in the CSV: 'Name', 'PictureID', 'Color List'
-    results = []
-
-    for _, row in test_data.iterrows():
-        name = row['Name']
-        picture_id = row['Picture ID']
-        original_color_list = row['Color List']  # Get the original color list value
-
-        # Try downloading the image using Name first
-        try:
-            image_url = BASE_URL.format(name)
-            image = download_image(image_url)
-        except Exception as e1:
-            print(f"Failed to download image using Name {name}: {e1}")
-            # Fallback to PictureID if Name fails
-            try:
-                image_url = BASE_URL.format(picture_id)
-                image = download_image(image_url)
-            except Exception as e2:
-                print(f"Failed to download image using PictureID {picture_id}: {e2}")
-                results.append({
-                    "Name": name,
-                    "Original Color List": original_color_list,
-                    "PredictedColor": "Error"
-                })
-                continue  # Skip this row if both attempts fail
-
-        # Extract color features
-        mean_color = extract_color_features_nw(image)
-
-        # Predict the closest color
-        predicted_color = knn.predict([mean_color])[0]
-        print(f"Predicted color for {name}: {predicted_color}")
-
-        # Append the result
-        results.append({
-            "Name": name,
-            "Original Color List": original_color_list,
-            "PredictedColor": predicted_color
-        })
-
-    # Save results to a CSV file
-    results_df = pd.DataFrame(results)
-    results_df.to_csv(output_csv_path, index=False)
+    # Rows stream through the pipeline and into the output file as they finish
+    with open(output_csv_path, "w", newline="") as output_file:
+        asyncio.run(_run_test_pipeline(knn, scale, test_csv_path, output_file))
     print(f"Results saved to {output_csv_path}")
+    metrics.report()
 
 def main():
     #print("Training the model...")
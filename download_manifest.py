@@ -0,0 +1,168 @@
+import csv
+import os
+import sqlite3
+import sys
+import time
+
+#persistent record of every image download, one row per identifier (the Name the file is saved as)
+#re-runs read it to decide what to fetch:
+#  - ok and checked recently          -> skip
+#  - ok but older than STALE_AFTER    -> conditional GET with the stored ETag / Last-Modified (304 = unchanged)
+#  - failed, pending or never seen    -> full download
+#rows are marked pending before the request goes out and committed as each result comes back,
+#so a crash just leaves some pending rows that the next run retries
+#python download_manifest.py [summary|failed] [manifest file]
+
+MANIFEST_FILE = "download_manifest.sqlite"
+STALE_AFTER = 7 * 24 * 3600  #seconds before an ok row is re-checked against the server
+
+OK, FAILED, PENDING = "ok", "failed", "pending"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    identifier    TEXT PRIMARY KEY,
+    internal_id   TEXT,
+    url           TEXT,
+    path          TEXT,
+    status        TEXT NOT NULL,
+    http_status   INTEGER,
+    etag          TEXT,
+    last_modified TEXT,
+    size          INTEGER,
+    sha256        TEXT,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    last_attempt  REAL,
+    last_success  REAL
+)
+"""
+
+COLUMNS = ("identifier", "internal_id", "url", "path", "status", "http_status", "etag", "last_modified",
+           "size", "sha256", "attempts", "error", "last_attempt", "last_success")
+
+class DownloadManifest:
+    def __init__(self, path=MANIFEST_FILE, stale_after=STALE_AFTER):
+        self.path = path
+        self.stale_after = stale_after
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def get(self, identifier):
+        row = self.db.execute("SELECT * FROM downloads WHERE identifier = ?", (identifier,)).fetchone()
+        return dict(row) if row else None
+
+    #(action, row) for an identifier: action is "skip", "check" (conditional GET) or "download"
+    def plan(self, identifier, now=None):
+        row = self.get(identifier)
+        if row is None or row["status"] != OK or not row["path"] or not os.path.exists(row["path"]):
+            return "download", row
+        now = time.time() if now is None else now
+        if now - (row["last_success"] or 0) < self.stale_after:
+            return "skip", row
+        return "check", row
+
+    #request headers for a conditional GET of an ok row
+    @staticmethod
+    def conditional_headers(row):
+        headers = {}
+        if row.get("etag"):
+            headers["If-None-Match"] = row["etag"]
+        if row.get("last_modified"):
+            headers["If-Modified-Since"] = row["last_modified"]
+        return headers
+
+    #record that a download is about to start, not committed here: the caller commit()s once its batch is queued
+    def mark_pending(self, identifier, internal_id=None):
+        self.db.execute(
+            """INSERT INTO downloads (identifier, internal_id, status, attempts, last_attempt)
+               VALUES (?, ?, ?, 1, ?)
+               ON CONFLICT(identifier) DO UPDATE SET
+                   internal_id = COALESCE(excluded.internal_id, internal_id),
+                   status = CASE WHEN status = 'ok' THEN status ELSE 'pending' END,
+                   attempts = attempts + 1, last_attempt = excluded.last_attempt""",
+            (identifier, internal_id, PENDING, time.time()),
+        )
+
+    #a file that is already on disk but has no row yet (downloaded before the manifest existed)
+    def adopt(self, identifier, path, internal_id=None):
+        now = time.time()
+        self.db.execute(
+            """INSERT OR IGNORE INTO downloads (identifier, internal_id, path, status, size, last_attempt, last_success)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (identifier, internal_id, path, OK, os.path.getsize(path), now, now),
+        )
+        self.db.commit()
+
+    #store a finished download, info is an async_downloader.DownloadInfo
+    def mark_ok(self, identifier, url, path, info):
+        now = time.time()
+        if info.status == 304:  #unchanged, keep size/hash but refresh the validators if the server sent new ones
+            self.db.execute(
+                """UPDATE downloads SET status = ?, http_status = 304, error = NULL,
+                       etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified),
+                       last_attempt = ?, last_success = ?
+                   WHERE identifier = ?""",
+                (OK, info.etag, info.last_modified, now, now, identifier),
+            )
+        else:
+            self.db.execute(
+                """UPDATE downloads SET url = ?, path = ?, status = ?, http_status = ?, etag = ?, last_modified = ?,
+                       size = ?, sha256 = ?, error = NULL, last_attempt = ?, last_success = ?
+                   WHERE identifier = ?""",
+                (url, path, OK, info.status, info.etag, info.last_modified, info.size, info.sha256, now, now, identifier),
+            )
+        self.db.commit()
+
+    #a failed re-check of an ok row keeps it ok (the file on disk is still good), anything else becomes failed
+    def mark_failed(self, identifier, error, http_status=None):
+        self.db.execute(
+            """UPDATE downloads SET status = CASE WHEN status = 'ok' THEN status ELSE 'failed' END,
+                   http_status = ?, error = ?, last_attempt = ?
+               WHERE identifier = ?""",
+            (http_status, str(error), time.time(), identifier),
+        )
+        self.db.commit()
+
+    def commit(self):
+        self.db.commit()
+
+    def failed(self):
+        return [dict(row) for row in self.db.execute(
+            "SELECT * FROM downloads WHERE status != ? ORDER BY identifier", (OK,))]
+
+    def counts(self):
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM downloads GROUP BY status").fetchall())
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "summary"
+    path = argv[1] if len(argv) > 1 else MANIFEST_FILE
+    if not os.path.exists(path):
+        print(f"No manifest at {path}")
+        return
+    with DownloadManifest(path) as manifest:
+        if command == "failed":  #same columns failed.csv used to have, plus why
+            writer = csv.writer(sys.stdout)
+            writer.writerow(["Internal ID", "Name", "HTTP Status", "Error", "Attempts"])
+            for row in manifest.failed():
+                writer.writerow([row["internal_id"], row["identifier"], row["http_status"], row["error"], row["attempts"]])
+        else:
+            for status, count in sorted(manifest.counts().items()):
+                print(f"{status:<10}{count:>8}")
+
+if __name__ == "__main__":
+    main()
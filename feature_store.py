@@ -0,0 +1,103 @@
+import os
+import numpy as np
+import metrics
+from features import DECODE_SCALE, extract_features_parallel, feature_names, feature_width
+from file_utils import atomic_write, file_hash
+
+#on-disk feature cache so retraining only decodes new or changed images
+#one columnar .npz per feature set and decode scale: paths, sizes, mtimes, content hashes and the (N, width) feature matrix
+
+CACHE_DIR = "feature_cache"
+
+class FeatureStore:
+    def __init__(self, method, cache_dir=CACHE_DIR, scale=DECODE_SCALE):
+        self.method = method
+        self.width = feature_width(method)
+        self.scale = scale
+        name = "+".join(feature_names(method))
+        if scale != 1:
+            name = f"{name}_s{scale}"
+        self.path = os.path.join(cache_dir, f"{name}.npz")
+        self.load()
+
+    def load(self):
+        self.paths = np.empty(0, dtype=str)
+        self.sizes = np.empty(0, dtype=np.int64)
+        self.mtimes = np.empty(0, dtype=np.int64)
+        self.hashes = np.empty(0, dtype="U32")
+        self.features = np.empty((0, self.width), dtype=np.float32)
+        if os.path.isfile(self.path):
+            with np.load(self.path) as data:
+                self.paths = data["paths"]
+                self.sizes = data["sizes"]
+                self.mtimes = data["mtimes"]
+                self.hashes = data["hashes"]
+                self.features = data["features"]
+        self.index = {path: i for i, path in enumerate(self.paths.tolist())}
+
+    def save(self):
+        with atomic_write(self.path, "wb") as f:
+            np.savez(f, paths=self.paths, sizes=self.sizes, mtimes=self.mtimes,
+                     hashes=self.hashes, features=self.features)
+
+    #features for every path, decoding only images that are new or changed since they were cached
+    def get(self, image_paths, workers=None):
+        keys = [os.path.abspath(p) for p in image_paths]
+        features = np.empty((len(keys), self.width), dtype=np.float32)
+        sizes = np.empty(len(keys), dtype=np.int64)
+        mtimes = np.empty(len(keys), dtype=np.int64)
+        hashes = [None] * len(keys)
+        missing = []
+
+        for i, key in enumerate(keys):
+            st = os.stat(key)
+            sizes[i], mtimes[i] = st.st_size, st.st_mtime_ns
+            j = self.index.get(key)
+            if j is not None and self.sizes[j] == st.st_size:
+                if self.mtimes[j] == st.st_mtime_ns:
+                    hashes[i] = self.hashes[j]
+                    features[i] = self.features[j]
+                    continue
+                #touched but maybe not changed, the content hash decides
+                hashes[i] = file_hash(key)
+                if hashes[i] == self.hashes[j]:
+                    features[i] = self.features[j]
+                    continue
+            missing.append(i)
+
+        metrics.inc("feature_cache_hits", len(keys) - len(missing))
+        metrics.inc("feature_cache_misses", len(missing))
+        if missing:
+            print(f"Feature cache: {len(keys) - len(missing)} hits, extracting {len(missing)} new or changed images")
+            features[missing] = extract_features_parallel([keys[i] for i in missing], self.method, workers=workers, scale=self.scale)
+            for i in missing:
+                if hashes[i] is None:
+                    hashes[i] = file_hash(keys[i])
+        else:
+            print(f"Feature cache: all {len(keys)} images cached")
+
+        self._merge(keys, sizes, mtimes, hashes, features)
+        return features
+
+    #fold fresh rows into the store and evict entries whose files are gone
+    def _merge(self, keys, sizes, mtimes, hashes, features):
+        requested = set(keys)
+        keep = [j for j, path in enumerate(self.paths.tolist())
+                if path not in requested and os.path.exists(path)]
+        evicted = len(self.paths) - len(keep) - sum(1 for k in requested if k in self.index)
+        if evicted:
+            print(f"Feature cache: evicted {evicted} entries for missing files")
+
+        self.paths = np.concatenate([self.paths[keep], np.array(keys, dtype=str)])
+        self.sizes = np.concatenate([self.sizes[keep], sizes])
+        self.mtimes = np.concatenate([self.mtimes[keep], mtimes])
+        self.hashes = np.concatenate([self.hashes[keep], np.array(hashes, dtype="U32")])
+        self.features = np.concatenate([self.features[keep], features])
+        self.index = {path: i for i, path in enumerate(self.paths.tolist())}
+
+#one-call helper: cached features for a list of image paths
+def cached_features(image_paths, method="nw", cache_dir=CACHE_DIR, workers=None, scale=DECODE_SCALE):
+    store = FeatureStore(method, cache_dir, scale)
+    features = store.get(image_paths, workers=workers)
+    store.save()
+    return features
@@ -0,0 +1,200 @@
+import os
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import metrics
+
+#shared color feature extractors + parallel extraction engine
+#used by classifier.py, whatcolor.py and csv_color.py
+
+#number of worker processes (None = one per core, 1 = run in this process)
+WORKERS = None
+
+#how many images each worker takes per task
+CHUNK_SIZE = 64
+
+#JPEG decode scale: 1 = full size, 2/4/8 = libjpeg DCT-domain downscaling while decoding
+#(much cheaper than a full decode, the saved model records which scale it was trained with)
+DECODE_SCALE = 1
+
+READ_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def _read_flag(scale):
+    if scale not in READ_FLAGS:
+        raise ValueError(f"Unsupported decode scale {scale}, expected one of {list(READ_FLAGS)}")
+    return READ_FLAGS[scale]
+
+#read an image from disk as BGR (OpenCV's native order, no conversion copy)
+def load_bgr(image_path, scale=DECODE_SCALE):
+    image = cv2.imread(image_path, _read_flag(scale))
+    if image is None:
+        raise ValueError(f"Could not read image: {image_path}")
+    return image
+
+#read an image from disk as RGB
+def load_rgb(image_path, scale=DECODE_SCALE):
+    return cv2.cvtColor(load_bgr(image_path, scale), cv2.COLOR_BGR2RGB) #RGB conversion func
+
+#decode encoded image bytes (e.g. a download) as RGB
+def decode_rgb(data, scale=DECODE_SCALE):
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), _read_flag(scale))
+    if image is None:
+        raise ValueError("Could not decode image bytes")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+#levels per channel in the coarse color histogram (4 -> 64 bins)
+HIST_LEVELS = 4
+
+#features the single-pass extractor can compute, with their widths
+#"mean" = average color, "nw" = average color without white, "center" = central pixel,
+#"hist" = coarse RGB histogram (fraction of pixels per bin, red-major)
+FEATURES = {"mean": 3, "nw": 3, "center": 3, "hist": HIST_LEVELS ** 3}
+
+#a method is one feature name or a sequence of them, e.g. "nw" or ("nw", "hist")
+def feature_names(method):
+    names = (method,) if isinstance(method, str) else tuple(method)
+    for name in names:
+        if name not in FEATURES:
+            raise ValueError(f"Unknown feature '{name}', expected any of {list(FEATURES)}")
+    return names
+
+def feature_width(method):
+    return sum(FEATURES[name] for name in feature_names(method))
+
+#compute every requested feature from one decoded image in a single pass
+#sums use integer accumulators and white pixels are counted (not copied out),
+#since each white pixel adds exactly 255 per channel the non-white mean is (total - 255 * white) / rest
+def image_features(image, method="nw", bgr=False):
+    names = feature_names(method)
+    rgb = [2, 1, 0] if bgr else [0, 1, 2]  #channel positions of R, G, B
+    height, width = image.shape[:2]
+    count = height * width
+
+    totals = None
+    if "mean" in names or "nw" in names:
+        totals = image.sum(axis=(0, 1), dtype=np.uint64)[rgb]
+
+    out = []
+    for name in names:
+        if name == "mean":
+            out.append(totals / count)
+        elif name == "nw":
+            white = cv2.countNonZero(cv2.inRange(image, (255, 255, 255), (255, 255, 255)))
+            rest = count - white
+            if rest > 0:
+                out.append((totals - np.uint64(255 * white)) / rest)
+            else:
+                out.append(np.zeros(3))  #default to black if no valid pixels
+        elif name == "center":
+            out.append(image[height // 2, width // 2][rgb])
+        elif name == "hist":
+            hist = cv2.calcHist([image], rgb, None, [HIST_LEVELS] * 3, [0, 256] * 3)
+            out.append(hist.ravel() / count)
+    return np.concatenate(out).astype(np.float32)
+
+#decode once and compute any subset of FEATURES
+def extract_features(image_path, method="nw", scale=DECODE_SCALE):
+    with metrics.timer("decode_ms"):
+        image = load_bgr(image_path, scale)
+    with metrics.timer("extract_ms"):
+        return image_features(image, method, bgr=True)
+
+#mean color of an RGB array
+def mean_color(image):
+    return image_features(image, "mean")
+
+#mean color of an RGB array without white pixels
+def mean_color_nw(image):
+    return image_features(image, "nw")
+
+#central pixel of an RGB array
+def center_pixel_color(image):
+    return image_features(image, "center")
+
+#how to calc mean image color
+def extract_color_features(image_path, scale=DECODE_SCALE):
+    return extract_features(image_path, "mean", scale)
+
+#calc mean color without white pixels
+def extract_color_features_nw(image_path, scale=DECODE_SCALE):
+    return extract_features(image_path, "nw", scale)
+
+#how to get central pixel color value
+def get_center_pixel_color(image_path, scale=DECODE_SCALE):
+    return extract_features(image_path, "center", scale)
+
+#single-feature extractors by name
+EXTRACTORS = {
+    "mean": extract_color_features,
+    "nw": extract_color_features_nw,
+    "center": get_center_pixel_color,
+}
+
+#which extractor and decode scale a saved model was trained with
+#(models saved before these were recorded used the non-white mean at full size)
+def model_feature_settings(model):
+    return getattr(model, "feature_method_", "nw"), getattr(model, "decode_scale_", 1)
+
+#walk a color/<label>/ folder tree, returns image paths and their labels
+def list_labeled_images(data_path):
+    paths = []
+    labels = []
+    for color_label in sorted(os.listdir(data_path)):
+        folder_path = os.path.join(data_path, color_label)
+        if not os.path.isdir(folder_path):  #skip non-foldered files
+            continue
+        for img_file in sorted(os.listdir(folder_path)):
+            paths.append(os.path.join(folder_path, img_file))
+            labels.append(color_label)
+    return paths, labels
+
+#worker task: extract one chunk of paths into a float32 block
+def _extract_chunk(task):
+    method, scale, paths = task
+    block = np.empty((len(paths), feature_width(method)), dtype=np.float32)
+    for i, path in enumerate(paths):
+        block[i] = extract_features(path, method, scale)
+    metrics.inc("images_extracted", len(paths))
+    return block
+
+#pool version: metrics recorded in the worker process are sent back with the block
+def _extract_chunk_worker(task):
+    collect, task = task
+    if not collect:
+        return _extract_chunk(task), None
+    metrics.enable()
+    metrics.reset()
+    block = _extract_chunk(task)
+    return block, metrics.snapshot()
+
+#extract features for every path into an (N, width) float32 matrix, rows in input order
+#method is a feature name or a sequence of them, see FEATURES
+def extract_features_parallel(image_paths, method="nw", workers=WORKERS, chunk_size=CHUNK_SIZE, scale=DECODE_SCALE):
+    width = feature_width(method)
+    _read_flag(scale)
+
+    paths = list(image_paths)
+    features = np.empty((len(paths), width), dtype=np.float32)
+    if not paths:
+        return features
+
+    tasks = [(method, scale, paths[i:i + chunk_size]) for i in range(0, len(paths), chunk_size)]
+    starts = range(0, len(paths), chunk_size)
+
+    if workers == 1 or len(tasks) == 1:
+        for block, start in zip(map(_extract_chunk, tasks), starts):
+            features[start:start + len(block)] = block
+        return features
+
+    #executor.map hands results back in submission order
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        worker_tasks = [(metrics.ENABLED, task) for task in tasks]
+        for (block, snap), start in zip(executor.map(_extract_chunk_worker, worker_tasks), starts):
+            features[start:start + len(block)] = block
+            metrics.merge(snap)
+    return features
@@ -0,0 +1,28 @@
+import hashlib
+import os
+from contextlib import contextmanager
+
+#small file helpers shared by the on-disk caches (feature_store, fuzzy_index, team_color_classifier)
+
+#hash of the raw file bytes, much cheaper than decoding or parsing the file
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+#open a temp file next to path and move it over path once the block finishes,
+#so readers only ever see the old file or the complete new one, never a half written one
+@contextmanager
+def atomic_write(path, mode="w", **open_kwargs):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, mode, **open_kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
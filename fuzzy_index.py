@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+from fuzzywuzzy import fuzz, utils
+from file_utils import atomic_write
+import metrics
+
+#memoized fuzzy matching for team_color_classifier
+#same answers as process.extractOne(query, choices) with its default processor and WRatio scorer,
+#but every team's candidates are normalized once and each distinct query is scored once per candidate set
+#results are cached as (candidate position, score) under a hash of the normalized candidates, so the
+#cache can be saved and reused by later runs on other team CSVs; a changed reference gets a new hash
+
+CACHE_FILE = "fuzzy_cache.json"
+
+#difflib and python-Levenshtein give slightly different scores, never mix their cached results
+SCORER = f"WRatio/{fuzz.SequenceMatcher.__module__}"
+
+#extractOne runs full_process on the query, then again with force_ascii; choices only get the second pass
+def normalize_query(query):
+    return utils.full_process(utils.full_process(query), force_ascii=True)
+
+def normalize_choice(choice):
+    return utils.full_process(choice, force_ascii=True)
+
+#one team's candidate list, normalized once
+class FuzzyIndex:
+    def __init__(self, choices):
+        self.choices = list(choices)
+        self.normalized = [normalize_choice(c) for c in self.choices]
+        self.key = hashlib.blake2b("\x1f".join(self.normalized).encode("utf-8"), digest_size=16).hexdigest()
+
+    #(position, score) of the best candidate for an already normalized query, first one wins ties like extractOne
+    def best(self, normalized_query):
+        best_pos, best_score = None, -1
+        for pos, choice in enumerate(self.normalized):
+            score = fuzz.WRatio(normalized_query, choice, full_process=False)
+            if score > best_score:
+                best_pos, best_score = pos, score
+        return best_pos, best_score
+
+class FuzzyMatcher:
+    def __init__(self, cache_file=CACHE_FILE):
+        self.cache_file = cache_file
+        self.indexes = {}
+        self.results = {}  #index key -> {normalized query: [position, score]}
+        self.added = {}    #same layout, only what was scored since take_added()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not self.cache_file or not os.path.isfile(self.cache_file):
+            return
+        with open(self.cache_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("scorer") == SCORER:
+            self.results = data["results"]
+
+    def save(self):
+        if not self.cache_file or not self.dirty:
+            return
+        with atomic_write(self.cache_file, "w", encoding="utf-8") as f:
+            json.dump({"scorer": SCORER, "results": self.results}, f)
+        self.dirty = False
+
+    #results scored since the last call, e.g. to send from a worker process back to the one that saves
+    def take_added(self):
+        added, self.added = self.added, {}
+        return added
+
+    def merge(self, added):
+        for key, hits in added.items():
+            self.results.setdefault(key, {}).update(hits)
+            self.dirty = True
+
+    #index for a team's candidates, built on first use
+    def index(self, team, choices):
+        index = self.indexes.get(team)
+        if index is None:
+            index = self.indexes[team] = FuzzyIndex(choices)
+        return index
+
+    #{query: (closest match, score)} for all of a team's queries, each distinct query scored once
+    def match_many(self, team, choices, queries):
+        index = self.index(team, choices)
+        cached = self.results.setdefault(index.key, {})
+        matches = {}
+        for query in queries:
+            if query in matches:
+                continue
+            normalized = normalize_query(query)
+            hit = cached.get(normalized)
+            if hit is None:
+                metrics.inc("fuzzy_cache_misses")
+                with metrics.timer("fuzzy_match_ms"):
+                    hit = cached[normalized] = list(index.best(normalized))
+                self.added.setdefault(index.key, {})[normalized] = hit
+                self.dirty = True
+            else:
+                metrics.inc("fuzzy_cache_hits")
+            matches[query] = (index.choices[hit[0]], hit[1])
+        return matches
+
+    def match(self, team, choices, query):
+        return self.match_many(team, choices, [query])[query]
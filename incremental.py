@@ -0,0 +1,127 @@
+import argparse
+import csv
+import os
+import numpy as np
+from features import list_labeled_images
+from feature_store import cached_features
+from model_format import MappedKNN, save_model
+import metrics
+
+#incremental training: add newly tagged images to an existing mapped model without
+#re-reading the whole color/ tree. Only the new images are decoded, their rows are appended
+#to the saved training set and a new model version is written (the tree rebuilds lazily on load)
+#
+#new images come from
+#  - swiper_pick output: tagged_results.csv (Product Image + Selected Name) and to_create.csv
+#  - files in color/<label>/ the model has not seen yet (checked against its sources.txt)
+
+MODEL_DIR = "gray_model"
+DATA_PATH = "color/"
+IMAGE_FOLDER = "to_tag_images"
+TAGGED_CSV = "tagged_results.csv"
+TO_CREATE_CSV = "to_create.csv"
+LABEL_COLUMN = "Selected Name"  #which tagged column becomes the training label
+EXTENSIONS = ("jpg", "jpeg", "png")
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+#to_create.csv has no image column, the scraper saves images as <Name>.<ext>
+def _find_image(image_folder, name):
+    for ext in EXTENSIONS:
+        path = os.path.join(image_folder, f"{name}.{ext}")
+        if os.path.isfile(path):
+            return path
+    return None
+
+#(path, label) pairs from swiper_pick's output files
+def tagged_images(image_folder=IMAGE_FOLDER, tagged_csv=TAGGED_CSV, to_create_csv=TO_CREATE_CSV):
+    found = []
+    for csv_path in (tagged_csv, to_create_csv):
+        if not csv_path or not os.path.isfile(csv_path):
+            continue
+        with open(csv_path, "r", newline='', encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                label = row.get(LABEL_COLUMN, "")
+                if not label or label == "DNE":
+                    continue
+                image = row.get("Product Image")
+                path = os.path.join(image_folder, image) if image else _find_image(image_folder, row.get("Product Name", ""))
+                if path and os.path.isfile(path):
+                    found.append((path, label))
+                else:
+                    metrics.inc("incremental_missing_images")
+    return found
+
+#(path, label) pairs in data_path/<label>/ that aren't in `seen`
+def new_folder_images(data_path, seen):
+    if not data_path or not os.path.isdir(data_path):
+        return []
+    paths, labels = list_labeled_images(data_path)
+    return [(p, l) for p, l in zip(paths, labels) if _key(p) not in seen]
+
+#append new (path, label) pairs to the model in model_dir, returns (new model dir, number added)
+def incremental_update(model_dir=MODEL_DIR, out_dir=None, data_path=DATA_PATH, image_folder=IMAGE_FOLDER,
+                       tagged_csv=TAGGED_CSV, to_create_csv=TO_CREATE_CSV, workers=None):
+    model = MappedKNN(model_dir)
+    sources = model.sources()
+    seen = {_key(p) for p in sources}
+
+    additions = {}
+    for path, label in new_folder_images(data_path, seen) + tagged_images(image_folder, tagged_csv, to_create_csv):
+        if _key(path) not in seen:
+            additions[_key(path)] = (path, label)  #later rows win, e.g. a re-tag
+    if not additions:
+        print("No new images, model unchanged.")
+        return model_dir, 0
+
+    new_paths = [path for path, _ in additions.values()]
+    new_labels = [label for _, label in additions.values()]
+    print(f"Extracting {len(new_paths)} new images")
+    x_new = cached_features(new_paths, model.feature_method_, workers=workers, scale=model.decode_scale_)
+
+    X = np.vstack([model._fit_X, x_new.astype(np.float64)])
+    y = np.concatenate([model.classes_[model._y], np.array(new_labels)])
+
+    version = model.meta.get("model_version", 1) + 1
+    out_dir = out_dir or f"{model_dir.rstrip('/')}.v{version}"
+    meta = save_model(
+        out_dir, X, y, model.n_neighbors,
+        feature_method=model.feature_method_, decode_scale=model.decode_scale_, weights=model.weights,
+        sources=sources + new_paths,
+        model_version=version, parent_data_hash=model.meta["data_hash"], added=len(new_paths),
+    )
+    metrics.inc("incremental_added", len(new_paths))
+    print(f"Saved model v{version} to {out_dir}: {meta['n_samples']} points (+{len(new_paths)})")
+    return out_dir, len(new_paths)
+
+#swap the new version into model_dir, keeping the old one as <model_dir>.v<old version>
+def promote(model_dir, new_dir):
+    old_version = MappedKNN(model_dir).meta.get("model_version", 1)
+    backup = f"{model_dir.rstrip('/')}.v{old_version}"
+    if os.path.exists(backup):
+        raise FileExistsError(f"{backup} already exists, not overwriting it")
+    os.rename(model_dir, backup)
+    os.rename(new_dir, model_dir)
+    print(f"{model_dir} is now the new version, previous kept as {backup}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add newly tagged images to an existing model")
+    parser.add_argument("--model", default=MODEL_DIR, help="mapped model directory to extend")
+    parser.add_argument("--out", help="where to write the new version (default <model>.v<N>)")
+    parser.add_argument("--data", default=DATA_PATH, help="color/<label>/ tree to scan for new files")
+    parser.add_argument("--images", default=IMAGE_FOLDER, help="folder swiper_pick tagged from")
+    parser.add_argument("--tagged", default=TAGGED_CSV)
+    parser.add_argument("--to-create", default=TO_CREATE_CSV)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--promote", action="store_true", help="make the new version the current model")
+    args = parser.parse_args(argv)
+
+    new_dir, added = incremental_update(args.model, args.out, args.data, args.images,
+                                        args.tagged, args.to_create, args.workers)
+    if added and args.promote:
+        promote(args.model, new_dir)
+    metrics.report()
+
+if __name__ == "__main__":
+    main()
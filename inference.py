@@ -0,0 +1,78 @@
+import numpy as np
+from collections import namedtuple
+
+#batched KNN inference: one kneighbors pass per batch instead of one predict call per image
+#gives the same labels as model.predict plus the neighbor distances and how strong the vote was
+
+#rows per kneighbors call
+BATCH_SIZE = 4096
+
+#labels: (N,) predicted labels
+#distances: (N, k) distances to the k nearest training points
+#confidence: (N,) share of the (weighted) vote the winning label got, 0-1
+Prediction = namedtuple("Prediction", ["labels", "distances", "confidence"])
+
+#vote weights the same way KNeighborsClassifier does
+def _vote_weights(weights, distances):
+    if weights in (None, "uniform"):
+        return np.ones_like(distances)
+    if weights == "distance":
+        with np.errstate(divide="ignore"):
+            w = 1.0 / distances
+        exact = np.isinf(w).any(axis=1)
+        w[exact] = np.isinf(w[exact])  #exact matches win outright
+        return w
+    return weights(distances)
+
+#(N, n_classes) weighted neighbor votes for one batch
+def _tally(model, distances, indices):
+    neighbor_classes = model._y[indices]
+    if neighbor_classes.ndim != 2:
+        raise ValueError("predict_batch only supports single-output models")
+    weights = _vote_weights(model.weights, distances)
+
+    rows = np.arange(len(indices))
+    votes = np.zeros((len(indices), len(model.classes_)))
+    for j in range(indices.shape[1]):
+        votes[rows, neighbor_classes[:, j]] += weights[:, j]
+    return votes
+
+#tally the neighbor votes for one batch, ties go to the lowest class index like sklearn
+def _vote(model, distances, indices):
+    votes = _tally(model, distances, indices)
+    rows = np.arange(len(indices))
+    winners = votes.argmax(axis=1)
+    totals = votes.sum(axis=1)
+    confidence = np.divide(votes[rows, winners], totals, out=np.zeros(len(rows)), where=totals > 0)
+    return model.classes_[winners], confidence
+
+#predict an (N, d) feature array in batches of batch_size rows
+def predict_batch(model, features, batch_size=BATCH_SIZE):
+    x = np.atleast_2d(np.asarray(features))
+    k = model.n_neighbors
+    labels = np.empty(len(x), dtype=model.classes_.dtype)
+    distances = np.empty((len(x), k))
+    confidence = np.empty(len(x))
+
+    for start in range(0, len(x), batch_size):
+        stop = start + batch_size
+        batch_distances, batch_indices = model.kneighbors(x[start:stop])
+        labels[start:stop], confidence[start:stop] = _vote(model, batch_distances, batch_indices)
+        distances[start:stop] = batch_distances
+    return Prediction(labels, distances, confidence)
+
+#(N, n_classes) share of the vote every class got, columns in model.classes_ order, e.g. to rank candidates
+def class_scores(model, features, batch_size=BATCH_SIZE):
+    x = np.atleast_2d(np.asarray(features))
+    scores = np.zeros((len(x), len(model.classes_)))
+    for start in range(0, len(x), batch_size):
+        stop = start + batch_size
+        votes = _tally(model, *model.kneighbors(x[start:stop]))
+        totals = votes.sum(axis=1, keepdims=True)
+        np.divide(votes, totals, out=scores[start:stop], where=totals > 0)
+    return scores
+
+#shortcut for a single feature vector, returns (label, confidence)
+def predict_one(model, feature):
+    prediction = predict_batch(model, np.reshape(feature, (1, -1)))
+    return prediction.labels[0], prediction.confidence[0]
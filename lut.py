@@ -0,0 +1,118 @@
+import sys
+import time
+import numpy as np
+from features import feature_names, feature_width, model_feature_settings
+from inference import predict_batch
+
+#compile a fitted KNN into a dense RGB -> label lookup table
+#the features are only 3-D, so every quantized color can be classified ahead of time
+#and inference becomes one numpy fancy-index per batch
+#bits per channel: 6 -> 64^3 bins (256 KB), 8 -> 256^3 bins (16 MB)
+
+BITS = 6
+MODEL_FILE = "gray_model.pkl"
+REPORT_BITS = (4, 5, 6, 7, 8)
+
+#rows per kneighbors call while compiling
+COMPILE_BATCH = 1 << 16
+
+class ColorLUT:
+    def __init__(self, table, classes, bits, feature_method="nw", decode_scale=1):
+        self.table = table
+        self.classes = classes
+        self.bits = bits
+        self.shift = 8 - bits
+        self.feature_method_ = feature_method
+        self.decode_scale_ = decode_scale
+
+    #class ids for an (N, 3) array of RGB features
+    def predict_ids(self, features):
+        q = np.clip(np.asarray(features), 0, 255).astype(np.uint8) >> self.shift
+        return self.table[q[:, 0], q[:, 1], q[:, 2]]
+
+    #labels for an (N, 3) array of RGB features
+    def predict(self, features):
+        return self.classes[self.predict_ids(np.atleast_2d(features))]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, table=self.table, classes=self.classes, bits=self.bits,
+                     feature_method="+".join(feature_names(self.feature_method_)),
+                     decode_scale=self.decode_scale_)
+
+def load_lut(path):
+    with np.load(path) as data:
+        names = tuple(str(data["feature_method"]).split("+"))
+        return ColorLUT(data["table"], data["classes"], int(data["bits"]),
+                        names[0] if len(names) == 1 else names, int(data["decode_scale"]))
+
+#the color at the middle of every bin for one channel
+def _bin_centers(bits):
+    width = 256 >> bits
+    return (np.arange(1 << bits) + 0.5) * width
+
+#classify the center of every bin with the exact KNN
+def compile_lut(model, bits=BITS, batch_size=COMPILE_BATCH):
+    if not 1 <= bits <= 8:
+        raise ValueError("bits must be between 1 and 8")
+    method, scale = model_feature_settings(model)
+    if feature_width(method) != 3:
+        raise ValueError(f"Lookup tables need 3-D RGB features, model uses {method}")
+    classes = model.classes_
+    dtype = np.uint8 if len(classes) <= 256 else np.uint16
+    levels = 1 << bits
+    centers = _bin_centers(bits)
+
+    #one red slice (levels^2 colors) at a time keeps memory bounded
+    table = np.empty((levels, levels, levels), dtype=dtype)
+    g, b = np.meshgrid(centers, centers, indexing="ij")
+    plane = np.column_stack([np.zeros(g.size), g.ravel(), b.ravel()])
+    for r in range(levels):
+        plane[:, 0] = centers[r]
+        labels = predict_batch(model, plane, batch_size).labels
+        table[r] = np.searchsorted(classes, labels).reshape(levels, levels)
+
+    return ColorLUT(table, classes, bits, method, scale)
+
+#how often the LUT disagrees with the exact KNN on a set of features, per quantization level
+def lut_report(model, features, levels=REPORT_BITS):
+    exact = predict_batch(model, features).labels
+    rows = []
+    for bits in levels:
+        start = time.perf_counter()
+        lut = compile_lut(model, bits)
+        compile_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        predicted = lut.predict(features)
+        lookup_seconds = time.perf_counter() - start
+
+        rows.append({
+            "bits": bits,
+            "table_kb": round(lut.table.nbytes / 1024, 1),
+            "compile_seconds": round(compile_seconds, 2),
+            "lookup_ms": round(lookup_seconds * 1000, 3),
+            "disagree_pct": round(100.0 * np.mean(predicted != exact), 3),
+        })
+    return rows
+
+def main():
+    #python lut.py [model file] [bits]         -> compile and save <model>.lut.npz
+    #python lut.py report [model file]         -> disagreement vs exact KNN on the training points
+    import joblib
+    args = sys.argv[1:]
+    if args and args[0] == "report":
+        model = joblib.load(args[1] if len(args) > 1 else MODEL_FILE)
+        for row in lut_report(model, model._fit_X):
+            print("  " + ", ".join(f"{k}={v}" for k, v in row.items()))
+        return
+
+    model_file = args[0] if args else MODEL_FILE
+    bits = int(args[1]) if len(args) > 1 else BITS
+    lut = compile_lut(joblib.load(model_file), bits)
+    lut_path = f"{model_file.rsplit('.', 1)[0]}.lut{bits}.npz"
+    lut.save(lut_path)
+    print(f"Compiled {model_file} into {lut_path} ({lut.table.nbytes / 1024:.0f} KB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import math
+import os
+import threading
+import time
+
+#lightweight instrumentation: counters, timers and histograms shared by the whole pipeline
+#off by default; when off every call returns straight away (timer() hands back one shared no-op)
+#turn on with enable() or COLOR_METRICS=1, and COLOR_METRICS_FILE=<path> to write a metrics file at report()
+
+ENABLED = os.environ.get("COLOR_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("COLOR_METRICS_FILE")
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+#log2 buckets: bucket i holds values in [2^(i-1), 2^i) of the histogram's unit
+BUCKETS = 40
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets = [0] * BUCKETS
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        bucket = 0 if value < 1 else min(BUCKETS - 1, int(math.log2(value)) + 1)
+        self.buckets[bucket] += 1
+
+    #approximate percentile from the buckets (upper bound of the bucket it falls in)
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        target = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(self.max, float(2 ** i))
+        return self.max
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def inc(name, value=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+#record one value (sizes, latencies in ms, ...)
+def observe(name, value):
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(value)
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, (time.perf_counter() - self.start) * 1000.0)
+        return False
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+#with metrics.timer("decode"): ...   records milliseconds into the "decode" histogram
+def timer(name):
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name)
+
+#plain data copy of everything recorded, e.g. to send back from a worker process
+def snapshot():
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "histograms": {name: {**vars(h), "buckets": list(h.buckets)} for name, h in _histograms.items()},
+        }
+
+#fold a worker's snapshot into this process
+def merge(snap):
+    if not ENABLED or not snap:
+        return
+    with _lock:
+        for name, value in snap["counters"].items():
+            _counters[name] = _counters.get(name, 0) + value
+        for name, fields in snap["histograms"].items():
+            other = Histogram()
+            other.__dict__.update(fields)
+            if name in _histograms:
+                _histograms[name].merge(other)
+            else:
+                _histograms[name] = other
+
+def summary():
+    lines = []
+    with _lock:
+        for name in sorted(_counters):
+            lines.append(f"{name:<32}{_counters[name]:>14}")
+        for name in sorted(_histograms):
+            h = _histograms[name]
+            lines.append(f"{name:<32}{h.count:>14}  mean={h.total / h.count:.3f} "
+                         f"p50={h.percentile(50):.3f} p99={h.percentile(99):.3f} max={h.max:.3f} total={h.total:.1f}")
+    return "\n".join(lines)
+
+#metrics text file, one "name value" per line (prometheus-style names)
+def dump(path):
+    with _lock:
+        lines = []
+        for name in sorted(_counters):
+            lines.append(f"{_metric_name(name)}_total {_counters[name]}")
+        for name in sorted(_histograms):
+            h = _histograms[name]
+            base = _metric_name(name)
+            lines.append(f"{base}_count {h.count}")
+            lines.append(f"{base}_sum {h.total}")
+            lines.append(f"{base}_max {h.max}")
+            seen = 0
+            for i, n in enumerate(h.buckets):
+                seen += n
+                if n:
+                    lines.append(f'{base}_bucket{{le="{2 ** i}"}} {seen}')
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+def _metric_name(name):
+    return "color_" + "".join(c if c.isalnum() else "_" for c in name)
+
+#end of run: print the summary and write the metrics file if one is configured
+def report(path=None):
+    if not ENABLED:
+        return
+    print("=== metrics ===")
+    print(summary())
+    path = path or METRICS_FILE
+    if path:
+        dump(path)
+        print(f"Metrics written to {path}")
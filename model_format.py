@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+from inference import predict_batch
+
+#versioned, memory-mappable model artifact
+#a model is a directory holding:
+#  meta.json     format version, feature method, decode scale, n_neighbors, classes, training-data hash
+#  features.npy  (N, d) float64 training features, memory-mapped on load
+#  labels.npy    (N,) int32 class ids into meta["classes"], memory-mapped on load
+#  sources.txt   optional, one image path per line that the model has already seen
+#the neighbor tree is rebuilt lazily on the first query, so loading is just a couple of mmaps
+#and every worker process maps the same pages
+#features are stored as float64 because that is what the tree works in, so it can use the mapped array directly
+
+FORMAT = "color-knn"
+FORMAT_VERSION = 1
+
+META_FILE = "meta.json"
+FEATURES_FILE = "features.npy"
+LABELS_FILE = "labels.npy"
+SOURCES_FILE = "sources.txt"
+
+def data_hash(features, labels):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(features, dtype=np.float64).tobytes())
+    digest.update("\n".join(map(str, labels)).encode("utf-8"))
+    return digest.hexdigest()
+
+#write X / y as a model directory, returns the metadata
+def save_model(path, X, y, n_neighbors, feature_method="nw", decode_scale=1, weights="uniform",
+               sources=None, **extra_meta):
+    if weights not in ("uniform", "distance"):
+        raise ValueError("only 'uniform' or 'distance' weights can be saved")
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    classes, label_ids = np.unique(y, return_inverse=True)
+
+    meta = {
+        "format": FORMAT,
+        "version": FORMAT_VERSION,
+        "feature_method": feature_method if isinstance(feature_method, str) else list(feature_method),
+        "decode_scale": int(decode_scale),
+        "n_neighbors": int(n_neighbors),
+        "weights": weights,
+        "classes": classes.tolist(),
+        "n_samples": int(X.shape[0]),
+        "n_features": int(X.shape[1]),
+        "data_hash": data_hash(X, y),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **extra_meta,
+    }
+
+    #written into a sibling directory and swapped in, never over files a running process has mapped
+    path = path.rstrip("/\\") or path
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        np.save(os.path.join(tmp_path, FEATURES_FILE), X)
+        np.save(os.path.join(tmp_path, LABELS_FILE), label_ids.astype(np.int32))
+        if sources is not None:
+            with open(os.path.join(tmp_path, SOURCES_FILE), "w", encoding="utf-8") as f:
+                f.writelines(f"{source}\n" for source in sources)
+        with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        replace_dir(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return meta
+
+#move a finished directory to path; an existing one is renamed away first, so processes that
+#still map its files keep reading the old version until they reload
+def replace_dir(src, path):
+    if not os.path.exists(path):
+        os.rename(src, path)
+        return
+    old_path = f"{path}.old{os.getpid()}"
+    shutil.rmtree(old_path, ignore_errors=True)
+    os.rename(path, old_path)
+    try:
+        os.rename(src, path)
+    except BaseException:
+        os.rename(old_path, path)
+        raise
+    shutil.rmtree(old_path, ignore_errors=True)  #files still mapped elsewhere go away when they are unmapped
+
+#save a fitted KNeighborsClassifier in the mapped format
+def save_sklearn_model(knn, path, sources=None, **extra_meta):
+    return save_model(
+        path, knn._fit_X, knn.classes_[knn._y], knn.n_neighbors,
+        feature_method=getattr(knn, "feature_method_", "nw"),
+        decode_scale=getattr(knn, "decode_scale_", 1),
+        weights=knn.weights, sources=sources, **extra_meta,
+    )
+
+#read-only KNN over memory-mapped arrays, quacks like a fitted KNeighborsClassifier
+#for predict / kneighbors / predict_batch
+class MappedKNN:
+    def __init__(self, path, mmap_mode="r"):
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT or meta.get("version", 0) > FORMAT_VERSION:
+            raise ValueError(f"{path} is not a supported {FORMAT} v{FORMAT_VERSION} model")
+        self.path = path
+        self.meta = meta
+        self._fit_X = np.load(os.path.join(path, FEATURES_FILE), mmap_mode=mmap_mode)
+        self._y = np.load(os.path.join(path, LABELS_FILE), mmap_mode=mmap_mode)
+        self.classes_ = np.array(meta["classes"])
+        self.n_neighbors = meta["n_neighbors"]
+        self.weights = meta["weights"]
+        method = meta["feature_method"]
+        self.feature_method_ = method if isinstance(method, str) else tuple(method)
+        self.decode_scale_ = meta["decode_scale"]
+        self._tree = None
+
+    @property
+    def n_samples_fit_(self):
+        return len(self._fit_X)
+
+    #ball tree over the mapped features, built on first use
+    @property
+    def tree(self):
+        if self._tree is None:
+            from sklearn.neighbors import BallTree
+            self._tree = BallTree(self._fit_X)
+        return self._tree
+
+    def kneighbors(self, X, n_neighbors=None):
+        k = min(n_neighbors or self.n_neighbors, self.n_samples_fit_)
+        return self.tree.query(np.atleast_2d(np.asarray(X, dtype=np.float64)), k=k)
+
+    def predict(self, X):
+        return predict_batch(self, X).labels
+
+    #image paths this model was built from (empty if none were recorded)
+    def sources(self):
+        sources_path = os.path.join(self.path, SOURCES_FILE)
+        if not os.path.isfile(sources_path):
+            return []
+        with open(sources_path, encoding="utf-8") as f:
+            return [line.rstrip("\n") for line in f if line.strip()]
+
+def is_mapped_model(path):
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+#load any model artifact: mapped model directory, lut.py table (.npz) or joblib pickle
+def load_model(path):
+    if is_mapped_model(path):
+        return MappedKNN(path)
+    if path.endswith(".npz"):
+        from lut import load_lut
+        return load_lut(path)
+    import joblib
+    return joblib.load(path)
+
+def main():
+    #python model_format.py convert gray_model.pkl gray_model   -> pickle to mapped directory
+    #python model_format.py info gray_model                     -> print the metadata header
+    args = sys.argv[1:]
+    if len(args) == 3 and args[0] == "convert":
+        import joblib
+        meta = save_sklearn_model(joblib.load(args[1]), args[2])
+        print(f"Saved {args[2]} ({meta['n_samples']} points, {len(meta['classes'])} classes)")
+    elif len(args) == 2 and args[0] == "info":
+        print(json.dumps(MappedKNN(args[1]).meta, indent=2))
+    else:
+        print("usage: model_format.py convert <model.pkl> <model dir> | info <model dir>")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from features import decode_rgb, extract_features, feature_width, image_features, model_feature_settings
+from inference import predict_batch
+from lut import ColorLUT
+from model_format import load_model
+
+#resident prediction service: loads the model once and answers over HTTP on localhost or a unix socket
+#concurrent requests are micro-batched into one vectorized predict
+#
+#POST /predict  application/json  {"rgb": [[r, g, b], ...]} or {"paths": ["img.jpg", ...]}
+#POST /predict  image bytes (any other content type)
+#GET  /stats    latency and throughput counters
+
+MODEL_FILE = "gray_model"
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH = 1024     #max rows per predict call
+MAX_WAIT_MS = 2.0    #how long the first request in a batch waits for company
+LATENCY_WINDOW = 10000  #recent requests kept for latency percentiles
+
+#collects feature rows from request threads and predicts them together on one thread
+class MicroBatcher:
+    def __init__(self, model, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    #queue an (m, d) feature array, returns a Future for (labels, confidence)
+    def submit(self, features):
+        future = Future()
+        self.pending.put((np.atleast_2d(features), future))
+        return future
+
+    def _predict(self, features):
+        if isinstance(self.model, ColorLUT):
+            return self.model.predict(features), np.ones(len(features))
+        prediction = predict_batch(self.model, features, self.max_batch)
+        return prediction.labels, prediction.confidence
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            rows = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            try:
+                labels, confidence = self._predict(np.vstack([features for features, _ in batch]))
+            except Exception:
+                #something in the batch is bad, predict each request alone so only that one fails
+                for features, future in batch:
+                    try:
+                        future.set_result(self._predict(features))
+                    except Exception as e:
+                        future.set_exception(e)
+            else:
+                start = 0
+                for features, future in batch:
+                    stop = start + len(features)
+                    future.set_result((labels[start:stop], confidence[start:stop]))
+                    start = stop
+            with self.lock:
+                self.batches += 1
+                self.rows += rows
+
+    def record(self, seconds, ok=True):
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(seconds)
+            if not ok:
+                self.errors += 1
+
+    def stats(self):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000.0
+            uptime = time.time() - self.started
+            stats = {
+                "uptime_seconds": round(uptime, 1),
+                "requests": self.requests,
+                "errors": self.errors,
+                "rows": self.rows,
+                "batches": self.batches,
+                "mean_batch_rows": round(self.rows / self.batches, 2) if self.batches else 0,
+                "rows_per_second": round(self.rows / uptime, 2) if uptime else 0,
+            }
+        if len(latencies):
+            for p in (50, 90, 99):
+                stats[f"latency_p{p}_ms"] = round(float(np.percentile(latencies, p)), 3)
+        return stats
+
+class PredictHandler(BaseHTTPRequestHandler):
+    server_version = "ColorPredict/1.0"
+
+    def log_message(self, format, *args):
+        pass  #a print per request is slower than the prediction
+
+    def address_string(self):
+        #unix socket clients have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.server.batcher.stats())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _features(self, body):
+        features = np.atleast_2d(self._parse_features(body))
+        #checked here so one bad request gets its own 400 instead of failing the whole micro-batch
+        width = self.server.feature_width
+        if features.ndim != 2 or features.shape[0] == 0 or features.shape[1] != width:
+            raise ValueError(f"expected rows of {width} features for this model, got shape {list(features.shape)}")
+        if not np.isfinite(features).all():
+            raise ValueError("features must be finite numbers (no NaN or Infinity)")
+        return features
+
+    def _parse_features(self, body):
+        method, scale = self.server.feature_settings
+        content_type = self.headers.get("Content-Type", "")
+        if not content_type.startswith("application/json"):
+            return image_features(decode_rgb(body, scale), method)
+        request = json.loads(body)
+        if "rgb" in request:
+            return np.asarray(request["rgb"], dtype=np.float32)
+        if "paths" in request:
+            return np.array([extract_features(path, method, scale) for path in request["paths"]])
+        raise ValueError("expected 'rgb' or 'paths' in the request body")
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {"error": "not found"})
+            return
+        start = time.perf_counter()
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            features = self._features(body)
+            labels, confidence = self.server.batcher.submit(features).result()
+        except Exception as e:
+            self.server.batcher.record(time.perf_counter() - start, ok=False)
+            self._send_json(400, {"error": str(e)})
+            return
+        self.server.batcher.record(time.perf_counter() - start)
+        self._send_json(200, {"labels": [str(label) for label in labels],
+                              "confidence": [round(float(c), 4) for c in confidence]})
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def make_server(model, host=HOST, port=PORT, unix_socket=None):
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, PredictHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), PredictHandler)
+    server.batcher = MicroBatcher(model)
+    server.feature_settings = model_feature_settings(model)
+    server.feature_width = feature_width(server.feature_settings[0])
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident color prediction service")
+    parser.add_argument("--model", default=MODEL_FILE, help="mapped model directory, joblib model or lut.py table (.npz)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", help="listen on this unix socket path instead of TCP")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    server = make_server(model, args.host, args.port, args.unix)
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"Model {args.model} loaded, serving on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.batcher.stats()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import joblib
+import numpy as np
+from features import READ_FLAGS, extract_features_parallel, list_labeled_images, model_feature_settings
+
+#REPORT: how much do predicted labels shift when images are decoded at reduced JPEG scale?
+#runs the saved model over the labeled images at every decode scale and compares to its own scale
+
+MODEL_FILE = "gray_model.pkl"
+DATA_PATH = "color/"
+WORKERS = None
+
+def scale_report(model, image_paths, labels=None, workers=WORKERS):
+    method, model_scale = model_feature_settings(model)
+    predictions = {}
+    rows = []
+    for scale in sorted(READ_FLAGS):
+        start = time.perf_counter()
+        features = extract_features_parallel(image_paths, method, workers=workers, scale=scale)
+        elapsed = time.perf_counter() - start
+        predictions[scale] = (features, model.predict(features), elapsed)
+
+    base_features, base_labels, _ = predictions[model_scale]
+    for scale, (features, predicted, elapsed) in predictions.items():
+        row = {
+            "scale": f"1/{scale}",
+            "extract_seconds": round(elapsed, 3),
+            "labels_changed_pct": round(100.0 * np.mean(predicted != base_labels), 2),
+            "mean_feature_shift": round(float(np.mean(np.abs(features - base_features))), 3),
+        }
+        if labels is not None:
+            row["accuracy_pct"] = round(100.0 * np.mean(predicted == np.asarray(labels)), 2)
+        rows.append(row)
+    return rows
+
+def main():
+    model_file = sys.argv[1] if len(sys.argv) > 1 else MODEL_FILE
+    data_path = sys.argv[2] if len(sys.argv) > 2 else DATA_PATH
+
+    model = joblib.load(model_file)
+    method, model_scale = model_feature_settings(model)
+    paths, labels = list_labeled_images(data_path)
+    if not paths:  #plain folder of images, no labels
+        paths = [os.path.join(data_path, f) for f in sorted(os.listdir(data_path)) if f.lower().endswith(('jpeg', 'jpg'))]
+        labels = None
+
+    print(f"Model {model_file}: feature '{method}', trained at decode scale 1/{model_scale}, {len(paths)} images")
+    for row in scale_report(model, paths, labels):
+        print("  " + ", ".join(f"{k}={v}" for k, v in row.items()))
+
+if __name__ == "__main__":
+    main()
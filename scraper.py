@@ -1,48 +1,50 @@
 import os
-import requests
 import pandas as pd
-from PIL import Image
-from io import BytesIO
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from async_downloader import DownloadError, normalize_image, run_downloads
+import metrics
 
 #constant vars
 CSV_FILE = 'images.csv'
 FOLDER_NAME = 'images'
 BASE_URL = 'https://media.rallyhouse.com/homepage/{}-1.jpg?tx=f_auto,c_fit,w_730,h_730'
 
-#create the folder to store scraped images
-os.makedirs(FOLDER_NAME, exist_ok=True)
-
-#read csv
-dataFile = pd.read_csv(CSV_FILE)
+#download settings, see async_downloader.py
+CONCURRENCY = 16
+PER_HOST_RATE = 20.0
 
 #data validation
 ITEM_COL = 'Name'
 
-if ITEM_COL not in dataFile.columns:
-    raise ValueError(f"'{ITEM_COL}' column not found in the CSV file.")
-
-#put it all together, iterate over skus in the csv
-for Name in dataFile[ITEM_COL]:
-    img_url = BASE_URL.format(Name)
-
-    
-    try:
-        #request image
-        response = requests.get(img_url, headers={'User-Agent': 'Mozilla/5.0'}, stream = True)
-        response.raise_for_status()  # Raise an error for bad responses
-
-        #open and save image
-        image = Image.open(BytesIO(response.content))
-
-        if image.mode == "P":
-            image = image.convert("RGB")
-        
-        image_path = os.path.join(FOLDER_NAME, f"{Name}.jpg")
-        image.save(image_path)
-
-        print(f"Downloaded: {image_path}")
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to download {Name}: {e}")
-print('Download Complete')
+def print_result(name, result):
+    if isinstance(result, DownloadError):
+        metrics.inc("downloads_failed")
+        print(f"Failed to download {name}: {result}")
+    elif isinstance(result, Exception):
+        metrics.inc("downloads_failed")
+        print(f"Error processing {name}: {result}")
+    else:
+        metrics.inc("downloads_ok")
+        print(f"Downloaded: {result[1]}")
+
+def main(csv_file=CSV_FILE, folder_name=FOLDER_NAME, base_url=BASE_URL):
+    #create the folder to store scraped images
+    os.makedirs(folder_name, exist_ok=True)
+
+    #read csv
+    dataFile = pd.read_csv(csv_file)
+
+    if ITEM_COL not in dataFile.columns:
+        raise ValueError(f"'{ITEM_COL}' column not found in the CSV file.")
+
+    #put it all together, one download job per sku in the csv
+    jobs = [
+        (Name, [(base_url.format(Name), os.path.join(folder_name, f"{Name}.jpg"))])
+        for Name in dataFile[ITEM_COL]
+    ]
+    run_downloads(jobs, on_result=print_result, finalize=normalize_image,
+                  concurrency=CONCURRENCY, per_host_rate=PER_HOST_RATE)
+    print('Download Complete')
+    metrics.report()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,8 @@
 import os
-import requests
 import pandas as pd
-from PIL import Image
-from io import BytesIO
-import concurrent.futures
-import threading
+from async_downloader import DownloadError, normalize_image, run_downloads
+from download_manifest import MANIFEST_FILE, DownloadManifest
+import metrics
 
 # Constant variables
 TEAM_CODE = "haleyyyyyyy"
@@ -14,83 +12,105 @@ BASE_URL = 'https://media.rallyhouse.com/homepage/{}-1.jpg?tx=f_auto,c_fit,w_730
 
 #TO ADD TO BUCKET: aws s3 cp "C:\Users\DavidNissly\Desktop\Git\AWS\FOLDER" s3://rh-college-logos/FOLDER/ --recursive
 
-# Create the folder to store scraped images
-os.makedirs(FOLDER_NAME, exist_ok=True)
-
-# Read CSV
-dataFile = pd.read_csv(CSV_FILE, dtype=str)
-
 # Data validation
 ITEM_COL = 'Name'
 PICTURE_ID_COL = 'Picture ID'
 
-if ITEM_COL not in dataFile.columns or PICTURE_ID_COL not in dataFile.columns:
-    raise ValueError(f"'{ITEM_COL}' or '{PICTURE_ID_COL}' column not found in the CSV file.")
-
-failed_downloads = []
-failed_lock = threading.Lock()
-
-# Function to download an image
-def download_image(identifier, save_as, internal_id):
-    extensions = ['jpg', 'jpeg', 'png']
-    for ext in extensions:
+# Download settings, see async_downloader.py
+# Concurrency adapts to the CDN (AIMD on latency, errors and 429s), starting at CONCURRENCY
+# and never above MAX_IN_FLIGHT, so there is no fixed per-host rate on top of it
+CONCURRENCY = 8
+MAX_IN_FLIGHT = 64
+ADAPTIVE = True
+PER_HOST_RATE = None
+READ_CHUNK = 1000  # CSV rows read at a time
+EXTENSIONS = ['jpg', 'jpeg', 'png']
+PROBE_EXTENSIONS = True  # Request every extension at once instead of one after another
+
+# Path of an image saved before the manifest existed, or None
+def existing_image(save_as):
+    for ext in EXTENSIONS:
         image_path = os.path.join(FOLDER_NAME, f"{save_as}.{ext}")
-        # Check if the image already exists
         if os.path.exists(image_path):
-            print(f"Skipped: {image_path} (already exists)")
-            return True  # Already exists, not a failure
-
-        img_url = BASE_URL.format(identifier).replace('.jpg', f'.{ext}')
-        try:
-            # Request image
-            response = requests.get(img_url, headers={'User-Agent': 'Mozilla/5.0'}, stream=True)
-            response.raise_for_status()  # Raise an error for bad responses
-
-            # Open and save image
-            image = Image.open(BytesIO(response.content))
-
-            if image.mode == "P":
-                image = image.convert("RGB")
-
-            image.save(image_path)
-            print(f"Downloaded: {image_path}")
-            return True  # Indicate success
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to download {save_as} as .{ext}: {e}")
-        except Exception as e:
-            print(f"Error processing {save_as} as .{ext}: {e}")
-
-    # If all attempts fail
-    with failed_lock:
-        failed_downloads.append({'Internal ID': internal_id, 'Name': save_as})
-    return False  # Indicate failure
-
-# Iterate over rows in the CSV
-def main():
-    tasks = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-        for _, row in dataFile.iterrows():
-            name = row[ITEM_COL]
-            picture_id = row[PICTURE_ID_COL]
+            return image_path
+    return None
+
+# Candidate (url, path) pairs for an image, one per extension
+def build_candidates(identifier, save_as, base_url=BASE_URL):
+    return [
+        (base_url.format(identifier).replace('.jpg', f'.{ext}'), os.path.join(FOLDER_NAME, f"{save_as}.{ext}"))
+        for ext in EXTENSIONS
+    ]
+
+# Download jobs for the rows in the CSV, read a chunk at a time as the downloader asks for more
+def iter_jobs(csv_file, manifest, base_url=BASE_URL):
+    for chunk in pd.read_csv(csv_file, dtype=str, chunksize=READ_CHUNK):
+        for name, picture_id in zip(chunk[ITEM_COL], chunk[PICTURE_ID_COL]):
             internal_id = picture_id  # Or another column if you have a different internal ID
-            if name == picture_id:
-                # Download using Name
-                tasks.append(executor.submit(download_image, name, name, internal_id))
+            # Download using Name if it matches the Picture ID, otherwise using Picture ID
+            identifier = name if name == picture_id else picture_id
+
+            action, entry = manifest.plan(name)
+            if action == "download" and entry is None:
+                image_path = existing_image(name)
+                if image_path:  # Downloaded before the manifest existed, re-checked once it goes stale
+                    manifest.adopt(name, image_path, internal_id)
+                    action = "skip"
+            if action == "skip":
+                metrics.inc("downloads_skipped")
+                print(f"Skipped: {name} (up to date)")
+                continue
+            if action == "check" and entry["url"]:
+                candidates = [(entry["url"], entry["path"], DownloadManifest.conditional_headers(entry))]
             else:
-                # Download using Picture ID
-                tasks.append(executor.submit(download_image, picture_id, name, internal_id))
-        # Optionally, wait for all tasks to complete and print summary
-        concurrent.futures.wait(tasks)
-
-    # Write failed downloads to CSV
-    if failed_downloads:
-        failed_df = pd.DataFrame(failed_downloads)
-        failed_df.to_csv('failed.csv', index=False)
-        print(f"Failed downloads written to failed.csv ({len(failed_downloads)} entries)")
+                candidates = build_candidates(identifier, name, base_url)
+            manifest.mark_pending(name, internal_id)
+            yield name, candidates
+        manifest.commit()  # Pending rows of the whole chunk in one transaction
+
+# Iterate over rows in the CSV
+# Failed rows stay in the manifest and are retried on the next run, see download_manifest.py
+def main(csv_file=CSV_FILE, base_url=BASE_URL, manifest_file=MANIFEST_FILE):
+    # Create the folder to store scraped images
+    os.makedirs(FOLDER_NAME, exist_ok=True)
+
+    # Check the header before starting
+    columns = pd.read_csv(csv_file, dtype=str, nrows=0).columns
+    if ITEM_COL not in columns or PICTURE_ID_COL not in columns:
+        raise ValueError(f"'{ITEM_COL}' or '{PICTURE_ID_COL}' column not found in the CSV file.")
+
+    manifest = DownloadManifest(manifest_file)
+
+    def on_result(name, result):
+        if isinstance(result, Exception):
+            metrics.inc("downloads_failed")
+            print(f"Failed to download {name}: {result}")
+            manifest.mark_failed(name, result, result.status if isinstance(result, DownloadError) else None)
+        elif result[2].status == 304:
+            metrics.inc("downloads_not_modified")
+            print(f"Unchanged: {result[1]}")
+            manifest.mark_ok(name, *result)
+        else:
+            metrics.inc("downloads_ok")
+            print(f"Downloaded: {result[1]}")
+            manifest.mark_ok(name, *result)
+
+    try:
+        run_downloads(iter_jobs(csv_file, manifest, base_url), on_result=on_result,
+                      finalize=normalize_image, probe=PROBE_EXTENSIONS,
+                      concurrency=CONCURRENCY, adaptive=ADAPTIVE, max_in_flight=MAX_IN_FLIGHT,
+                      per_host_rate=PER_HOST_RATE)
+    finally:
+        failed = len(manifest.failed())
+        manifest.close()
+
+    if failed:
+        print(f"{failed} downloads not done, listed by: python download_manifest.py failed {manifest_file}")
     else:
         print("No failed downloads.")
 
     print('Download Complete')
+    metrics.report()
 
 if __name__ == "__main__":
     main()
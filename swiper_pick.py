@@ -1,9 +1,13 @@
 import pygame
 import os
 import csv
+import json
 import math
 import signal
 import sys
+import threading
+import time
+from collections import OrderedDict, deque
 
 # === CONFIG ===
 IMAGE_FOLDER = "to_tag_images"
@@ -12,80 +16,168 @@ TEAM_COLORS_CSV = "Colors By Team.csv"
 OUTPUT_CSV = "tagged_results.csv"
 ALL_COLOR_OPTIONS_CSV = "All Color Options.csv"
 TO_CREATE_CSV = "to_create.csv"
+JOURNAL_FILE = "tagging_journal.jsonl"  # every decision as it is made, until it reaches the CSVs
+JOURNAL_SYNC_EVERY = 10  # decisions between fsyncs of the journal
+JOURNAL_SYNC_SECONDS = 5  # or this long, whichever comes first
 BASE_WINDOW_HEIGHT = 700
 IMAGE_WIDTH = 511
-
-# === SETUP ===
-pygame.init()
-pygame.font.init()
-font = pygame.font.Font(None, 24)
-
-# Load all products from Color Import.csv
+IMAGE_HEIGHT = 512
+PREFETCH_AHEAD = 8  # upcoming images decoded and scaled in the background
+SURFACE_CACHE_SIZE = 2 * PREFETCH_AHEAD  # ready surfaces kept, least recently used dropped first
+MODEL_PATH = "gray_model"  # KNN (or lut table) used to rank each team's colors, None keeps CSV order
+
+# === STATE (filled in by main) ===
+font = None
+screen = None
+prefetcher = None
+journal = None
+stats = None
 products = []
-with open(INPUT_CSV, "r", newline='', encoding="utf-8-sig") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        products.append(row)
-
-# Load all team color options from Colors By Team.csv
+product_index = {}  # Name -> position in products
 team_color_options = {}
-with open(TEAM_COLORS_CSV, "r", newline='', encoding="utf-8-sig") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        team = row["Team"]
-        if team not in team_color_options:
-            team_color_options[team] = []
-        team_color_options[team].append({
-            "Name": row["Name"],
-            "Item Name Color": row["Item Name Color"]
-        })
-
-# Load all color options for DNE dropdown
 all_color_options = []
-with open(ALL_COLOR_OPTIONS_CSV, "r", newline='', encoding="utf-8-sig") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        all_color_options.append(row["Name"])
-
-# === RESUME LOGIC ===
 processed_names = set()
 already_written_names = set()
 tagged_results = []
-if os.path.isfile(OUTPUT_CSV):
-    with open(OUTPUT_CSV, "r", newline='', encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # Normalize keys to match the rest of the code
-            pname = row.get("Product Name", row.get("product_name", ""))
-            tagged_results.append({
-                "product_name": pname,
-                "image": row.get("Product Image", row.get("image", "")),
-                "team": row.get("Team", row.get("team", "")),
-                "selected_name": row.get("Selected Name", row.get("selected_name", "")),
-                "selected_item_name_color": row.get("Selected Item Name Color", row.get("selected_item_name_color", ""))
-            })
-            processed_names.add(pname)
-            already_written_names.add(pname)
-
 to_create_rows = []
-if os.path.isfile(TO_CREATE_CSV):
-    with open(TO_CREATE_CSV, "r", newline='', encoding="utf-8-sig") as f:
+to_create_names = set()
+
+# Load all products from Color Import.csv
+def load_products():
+    with open(INPUT_CSV, "r", newline='', encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+# Load all team color options from Colors By Team.csv
+def load_team_color_options():
+    options = {}
+    with open(TEAM_COLORS_CSV, "r", newline='', encoding="utf-8-sig") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            # Normalize keys to match the rest of the code
-            pname = row.get("Product Name", row.get("product_name", ""))
-            to_create_rows.append({
-                "product_name": pname,
-                "team": row.get("Team", row.get("team", "")),
-                "selected_name": row.get("Selected Name", row.get("selected_name", ""))
+            team = row["Team"]
+            if team not in options:
+                options[team] = []
+            options[team].append({
+                "Name": row["Name"],
+                "Item Name Color": row["Item Name Color"]
             })
-            processed_names.add(pname)
-            already_written_names.add(pname)
+    return options
 
-# Only process products not already tagged or in to_create
-products_to_process = [p for p in products if p["Name"] not in processed_names]
-data_index = 0
-last_selected_idx = 0  # Add this before the main loop
+# Load all color options for DNE dropdown
+def load_all_color_options():
+    with open(ALL_COLOR_OPTIONS_CSV, "r", newline='', encoding="utf-8-sig") as f:
+        return [row["Name"] for row in csv.DictReader(f)]
+
+# === DECISION JOURNAL ===
+# Each decision is appended to JOURNAL_FILE as one JSON line and handed to the OS straight away, so a crash of
+# this process loses nothing; the fsync that also covers an OS crash or power cut is batched (every
+# JOURNAL_SYNC_EVERY decisions or JOURNAL_SYNC_SECONDS). save_results() writes the CSVs as before and then removes
+# the journal, so after a crash the next run replays whatever never reached the CSVs.
+class DecisionJournal:
+    def __init__(self, path=JOURNAL_FILE, sync_every=JOURNAL_SYNC_EVERY, sync_seconds=JOURNAL_SYNC_SECONDS):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_seconds = sync_seconds
+        self.file = None
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    # Recorded decisions in order; a line torn by a crash is skipped
+    def replay(self):
+        entries = []
+        if not os.path.isfile(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    def record(self, kind, row):
+        if self.file is None:
+            torn = False
+            if os.path.isfile(self.path) and os.path.getsize(self.path):
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+            self.file = open(self.path, "a", encoding="utf-8")
+            if torn:  # start after a torn last line, not on it
+                self.file.write("\n")
+        self.file.write(json.dumps({"kind": kind, **row}) + "\n")
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_seconds:
+            self.sync()
+
+    def sync(self):
+        if self.file and self.unsynced:
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    # Everything recorded is in the CSVs now
+    def clear(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.unsynced = 0
+
+# Add a decision to the in-memory results; False if the product already has a to_create row
+def remember(kind, row):
+    if kind == "to_create":
+        if row["product_name"] in to_create_names:
+            return False
+        to_create_names.add(row["product_name"])
+        to_create_rows.append(row)
+    else:
+        tagged_results.append(row)
+    processed_names.add(row["product_name"])
+    return True
+
+# === RESUME LOGIC ===
+def load_previous_results():
+    if os.path.isfile(OUTPUT_CSV):
+        with open(OUTPUT_CSV, "r", newline='', encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Normalize keys to match the rest of the code
+                pname = row.get("Product Name", row.get("product_name", ""))
+                tagged_results.append({
+                    "product_name": pname,
+                    "image": row.get("Product Image", row.get("image", "")),
+                    "team": row.get("Team", row.get("team", "")),
+                    "selected_name": row.get("Selected Name", row.get("selected_name", "")),
+                    "selected_item_name_color": row.get("Selected Item Name Color", row.get("selected_item_name_color", ""))
+                })
+                processed_names.add(pname)
+                already_written_names.add(pname)
+
+    if os.path.isfile(TO_CREATE_CSV):
+        with open(TO_CREATE_CSV, "r", newline='', encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Normalize keys to match the rest of the code
+                pname = row.get("Product Name", row.get("product_name", ""))
+                to_create_rows.append({
+                    "product_name": pname,
+                    "team": row.get("Team", row.get("team", "")),
+                    "selected_name": row.get("Selected Name", row.get("selected_name", ""))
+                })
+                to_create_names.add(pname)
+                processed_names.add(pname)
+                already_written_names.add(pname)
+
+    # Decisions made after the last save_results(), e.g. before a crash
+    replayed = 0
+    for entry in journal.replay():
+        kind = entry.pop("kind", "tagged")
+        if entry.get("product_name") not in already_written_names and remember(kind, entry):
+            replayed += 1
+    if replayed:
+        print(f"Recovered {replayed} decisions from {journal.path}")
 
 def get_tag_options_for_team(team):
     # Always add DNE as the first option
@@ -117,14 +209,160 @@ def calc_column_widths(tag_options):
         column_widths.append(column_width)
     return column_widths, max_rows_per_group, column_height
 
-def show_image_with_options(image_path, tag_options, current_index, total_images):
-    screen.fill((255, 255, 255))
+# === MODEL RANKING ===
+# The trained model scores each image as it is prefetched (same features and decode scale as whatcolor.py).
+# Model classes are matched to a team's options by Name or Item Name Color, ignoring case.
+
+# Function image path -> {lowercased class: share of the vote}, or None if there is no model to load
+def load_ranker(model_path=MODEL_PATH):
+    if not model_path or not os.path.exists(model_path):
+        print(f"No model at {model_path}, color options stay in CSV order")
+        return None
+    from features import extract_features, model_feature_settings
+    from inference import class_scores
+    from lut import ColorLUT
+    from model_format import load_model
+    model = load_model(model_path)
+    method, scale = model_feature_settings(model)
+    is_lut = isinstance(model, ColorLUT)
+    classes = [str(c).lower() for c in (model.classes if is_lut else model.classes_)]
+
+    def rank(image_path):
+        feature = extract_features(image_path, method, scale).reshape(1, -1)
+        if is_lut:  # a table only knows its single answer
+            return {classes[model.predict_ids(feature)[0]]: 1.0}
+        scores = {}
+        for label, score in zip(classes, class_scores(model, feature)[0]):
+            if score > scores.get(label, 0):
+                scores[label] = float(score)
+        return scores
+    return rank
+
+# DNE stays first, the team's colors follow by predicted likelihood (CSV order among equals);
+# also returns whether the model had a guess among them
+def rank_tag_options(tag_options, scores):
+    def score(option):
+        return max(scores.get(option["name"].lower(), 0), scores.get(option["item_name_color"].lower(), 0))
+    ranked = sorted(tag_options[1:], key=score, reverse=True)
+    return tag_options[:1] + ranked, bool(ranked) and score(ranked[0]) > 0
+
+# Items per minute and how often the preselected top guess was taken, shown under the image
+class TaggingStats:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.items = 0
+        self.guessed = 0
+        self.accepted = 0
+
+    def record(self, guessed, accepted):
+        self.items += 1
+        self.guessed += guessed
+        self.accepted += accepted
+
+    def items_per_minute(self):
+        minutes = (time.monotonic() - self.start) / 60
+        return self.items / minutes if minutes > 0 else 0.0
+
+    def summary(self):
+        text = f"{self.items} items, {self.items_per_minute():.1f}/min"
+        if self.guessed:
+            text += f", top guess taken {self.accepted}/{self.guessed} ({self.accepted / self.guessed:.0%})"
+        return text
+
+# === IMAGE PREFETCH ===
+# A background thread loads and scales the next PREFETCH_AHEAD images while the current one is being tagged,
+# so moving to the next product only blits a ready surface. Surfaces never touch the display here.
+def load_scaled_image(image_path):
     image = pygame.image.load(image_path)
-    image = pygame.transform.scale(image, (IMAGE_WIDTH, 512))
+    return pygame.transform.scale(image, (IMAGE_WIDTH, IMAGE_HEIGHT))
+
+class ImagePrefetcher:
+    def __init__(self, capacity=SURFACE_CACHE_SIZE, ranker=None):
+        self.capacity = capacity
+        self.ranker = ranker
+        self.ready = OrderedDict()  # image path -> (scaled surface, model scores), in least recently used order
+        self.wanted = deque()
+        self.loading = None
+        self.stopped = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Replace the queue with these paths (nearest first), skipping ones already ready
+    def prefetch(self, image_paths):
+        with self.cond:
+            self.wanted = deque(p for p in image_paths if p not in self.ready)
+            self.cond.notify_all()
+
+    # (scaled surface, model scores or None) for an image, loaded right here if the thread hasn't got to it
+    def get(self, image_path):
+        with self.cond:
+            while image_path == self.loading:
+                self.cond.wait()
+            entry = self.ready.get(image_path)
+            if entry is not None:
+                self.ready.move_to_end(image_path)
+                return entry
+        entry = (load_scaled_image(image_path), self._rank(image_path))  # load errors show up here, like before
+        with self.cond:
+            self._store(image_path, entry)
+        return entry
+
+    def close(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+    # A model failure only loses the ranking, the image is still shown
+    def _rank(self, image_path):
+        if self.ranker is None:
+            return None
+        try:
+            return self.ranker(image_path)
+        except Exception as e:
+            print(f"Could not rank {image_path}: {e}")
+            return None
+
+    def _store(self, image_path, entry):
+        self.ready[image_path] = entry
+        self.ready.move_to_end(image_path)
+        while len(self.ready) > self.capacity:
+            self.ready.popitem(last=False)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.wanted and not self.stopped:
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                image_path = self.wanted.popleft()
+                if image_path in self.ready:
+                    continue
+                self.loading = image_path
+            image = scores = None
+            try:
+                if os.path.isfile(image_path):
+                    image = load_scaled_image(image_path)
+                    scores = self._rank(image_path)
+            except Exception:
+                image = None  # get() loads it again and reports the error
+            finally:
+                # Always clear loading, or a get() waiting on this path would never wake up
+                with self.cond:
+                    self.loading = None
+                    if image is not None:
+                        self._store(image_path, (image, scores))
+                    self.cond.notify_all()
+
+def show_image_with_options(image, tag_options, current_index, total_images):
+    screen.fill((255, 255, 255))
     screen.blit(image, (0, 0))
     # Only show product image and progress text
     progress_text = font.render(f"Image {current_index + 1} of {total_images}", True, (0, 0, 0))
     screen.blit(progress_text, (10, 520))
+    if stats:
+        screen.blit(font.render(stats.summary(), True, (0, 0, 0)), (10, 545))
     pygame.display.flip()
 
 def save_results():
@@ -156,6 +394,9 @@ def save_results():
                 writer.writerow([item["product_name"], item["team"], item["selected_name"]])
                 already_written_names.add(item["product_name"])
 
+    if journal:
+        journal.clear()
+
 def show_dropdown(screen, options, prompt="Select a color option (Up/Down, Enter):", x=100, y=100, selected=0):
     per_page = 15
     scroll = max(0, selected - per_page + 1)
@@ -239,82 +480,137 @@ def show_dropdown(screen, options, prompt="Select a color option (Up/Down, Enter
 
 def save_to_create(row):
     # Only add to in-memory list if not already present
-    if row["product_name"] not in [item["product_name"] for item in to_create_rows]:
-        to_create_rows.append(row)
+    if remember("to_create", row):
+        journal.record("to_create", row)
+
+def save_tagged(row):
+    remember("tagged", row)
+    journal.record("tagged", row)
 
 def handle_exit(*args):
     save_results()
+    if stats:
+        print(stats.summary())
+    if prefetcher:
+        prefetcher.close()
     pygame.quit()
     sys.exit()  # <-- Change exit() to sys.exit()
 
-# Register signal handler for graceful exit
-signal.signal(signal.SIGINT, handle_exit)
+def main(model_path=MODEL_PATH):
+    global font, screen, prefetcher, journal, stats, products, team_color_options, all_color_options
 
-# === MAIN LOOP ===
-while data_index < len(products_to_process):
-    current_product = products_to_process[data_index]
-    image_path = os.path.join(IMAGE_FOLDER, current_product["Image"])
-    team = current_product["Team"]
+    # === SETUP ===
+    pygame.init()
+    pygame.font.init()
+    font = pygame.font.Font(None, 24)
 
-    if not os.path.isfile(image_path):
-        print(f"Image not found: {image_path}. Skipping product {current_product['Name']}.")
-        data_index += 1
-        continue
+    products = load_products()
+    for i, p in enumerate(products):
+        product_index.setdefault(p["Name"], i)
+    team_color_options = load_team_color_options()
+    all_color_options = load_all_color_options()
+    journal = DecisionJournal()
+    load_previous_results()
 
-    tag_options = get_tag_options_for_team(team)
-    if not tag_options:
-        print(f"No color options for team: {team}")
-        data_index += 1
-        continue
+    # Only process products not already tagged or in to_create
+    products_to_process = [p for p in products if p["Name"] not in processed_names]
+    data_index = 0
+    last_selected_idx = 0
+    last_guessed = False  # whether last_selected_idx is a position in a model-ranked list
 
-    # Find the index of the current product in the original products list
-    original_index = next((i for i, p in enumerate(products) if p["Name"] == current_product["Name"]), data_index)
+    # Register signal handler for graceful exit
+    signal.signal(signal.SIGINT, handle_exit)
 
+    # The window is created once, the prefetcher keeps the next images ready for it
     window_width = IMAGE_WIDTH + 520  # 500 for dropdown + margin
     window_height = max(BASE_WINDOW_HEIGHT, 800)
     WINDOW_SIZE = (window_width, window_height)
     screen = pygame.display.set_mode(WINDOW_SIZE)
-    show_image_with_options(image_path, tag_options, original_index, len(products))
-
-    # Prepare dropdown options
-    dropdown_options = [opt["display_name"] for opt in tag_options]
-    # Ensure last_selected_idx is in range
-    if last_selected_idx >= len(dropdown_options):
-        last_selected_idx = 0
-    selected_display, last_selected_idx = show_dropdown(
-        screen, dropdown_options, prompt="Select a color option (Up/Down, Enter):", x=IMAGE_WIDTH + 10, y=10, selected=last_selected_idx
-    )
-    if selected_display is None:
-        continue
-
-    # Map back to the selected tag_option
-    selected_idx = dropdown_options.index(selected_display)
-    selected_option = tag_options[selected_idx]
-    last_selected_idx = selected_idx  # Update for next item
-
-    if selected_option["name"] == "DNE":
-        # For DNE, reset to 0 for the DNE dropdown
-        selected_color, _ = show_dropdown(
-            screen, all_color_options, prompt="Select DNE color (Up/Down, Enter):", x=IMAGE_WIDTH + 10, y=10, selected=0
+    prefetcher = ImagePrefetcher(ranker=load_ranker(model_path))
+    stats = TaggingStats()
+
+    # === MAIN LOOP ===
+    while data_index < len(products_to_process):
+        current_product = products_to_process[data_index]
+        image_path = os.path.join(IMAGE_FOLDER, current_product["Image"])
+        team = current_product["Team"]
+
+        if not os.path.isfile(image_path):
+            print(f"Image not found: {image_path}. Skipping product {current_product['Name']}.")
+            data_index += 1
+            continue
+
+        tag_options = get_tag_options_for_team(team)
+        if not tag_options:
+            print(f"No color options for team: {team}")
+            data_index += 1
+            continue
+
+        # Find the index of the current product in the original products list
+        original_index = product_index.get(current_product["Name"], data_index)
+
+        prefetcher.prefetch([
+            os.path.join(IMAGE_FOLDER, p["Image"])
+            for p in products_to_process[data_index + 1:data_index + 1 + PREFETCH_AHEAD]
+        ])
+        image, scores = prefetcher.get(image_path)
+        # Most likely colors first, with the top guess preselected
+        guessed = False
+        if scores:
+            tag_options, guessed = rank_tag_options(tag_options, scores)
+        show_image_with_options(image, tag_options, original_index, len(products))
+
+        # Prepare dropdown options
+        dropdown_options = [opt["display_name"] for opt in tag_options]
+        if guessed:
+            last_selected_idx = 1
+        elif last_guessed:
+            last_selected_idx = 0  # a ranked position means nothing in CSV order
+        last_guessed = guessed
+        # Ensure last_selected_idx is in range
+        if last_selected_idx >= len(dropdown_options):
+            last_selected_idx = 0
+        selected_display, last_selected_idx = show_dropdown(
+            screen, dropdown_options, prompt="Select a color option (Up/Down, Enter):", x=IMAGE_WIDTH + 10, y=10, selected=last_selected_idx
         )
-        if selected_color:
-            save_to_create({
+        if selected_display is None:
+            continue
+
+        # Map back to the selected tag_option
+        selected_idx = dropdown_options.index(selected_display)
+        selected_option = tag_options[selected_idx]
+        last_selected_idx = selected_idx  # Update for next item
+
+        if selected_option["name"] == "DNE":
+            # For DNE, reset to 0 for the DNE dropdown
+            selected_color, _ = show_dropdown(
+                screen, all_color_options, prompt="Select DNE color (Up/Down, Enter):", x=IMAGE_WIDTH + 10, y=10, selected=0
+            )
+            if selected_color:
+                save_to_create({
+                    "product_name": current_product["Name"],
+                    "team": team,
+                    "selected_name": selected_color
+                })
+                stats.record(guessed, False)
+                data_index += 1
+        else:
+            # Save all info as before
+            save_tagged({
                 "product_name": current_product["Name"],
+                "image": current_product["Image"],
                 "team": team,
-                "selected_name": selected_color
+                "selected_name": selected_option["name"],
+                "selected_item_name_color": selected_option["item_name_color"]
             })
+            stats.record(guessed, guessed and selected_idx == 1)
             data_index += 1
-    else:
-        # Save all info as before
-        tagged_results.append({
-            "product_name": current_product["Name"],
-            "image": current_product["Image"],
-            "team": team,
-            "selected_name": selected_option["name"],
-            "selected_item_name_color": selected_option["item_name_color"]
-        })
-        data_index += 1
 
-# On normal exit
-save_results()
-pygame.quit()
\ No newline at end of file
+    # On normal exit
+    save_results()
+    print(stats.summary())
+    prefetcher.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
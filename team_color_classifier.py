@@ -1,105 +1,440 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
-from fuzzywuzzy import process
+from file_utils import atomic_write, file_hash
+from fuzzy_index import CACHE_FILE, FuzzyMatcher
+import metrics
 
-def classify_colors(input_csv, reference_csv, mapping_csv, output_csv, log_csv):
-    # Load the input CSV (first file)
-    input_data = pd.read_csv(input_csv)
+#hash-join engine: the mapping and the per-team reference are indexed once, exact matches are
+#resolved with a single merge and only the leftover rows go through fuzzy matching
+#fuzzy matching scores each team's distinct New Colors once and remembers them in fuzzy_cache.json (fuzzy_index.py)
+#results are the same as the old row-by-row loop (first mapping row wins, first team row wins,
+#NaN never matches anything), so the output and log CSVs don't change
 
-    # Load the reference CSV (second file)
-    reference_data = pd.read_csv(reference_csv)
+FUZZY_THRESHOLD = 80  # Use a threshold of 80 for a good match
+FUZZY_CACHE = CACHE_FILE  # None to keep fuzzy results for this run only
 
-    # Load the color mapping CSV (third file)
-    color_mapping = pd.read_csv(mapping_csv)
+# Compiled reference + mapping, cached on disk under a hash of the two source files
+REFERENCE_CACHE_DIR = "reference_cache"
+COMPILED_VERSION = 1  # bump when CompiledReference changes so old cache files are ignored
 
-    # Ensure the output columns exist in the input data
-    input_data['Parent Color Primary'] = ""
-    input_data['Item Name Color Primary'] = ""
+# Streaming mode (classify_colors_streaming) for whole-catalog exports
+CHUNK_ROWS = 50000  # input rows read, classified and written at a time
+WORKERS = None      # worker processes, None = one per CPU, 1 = no pool
 
-    # List to store log messages
-    log_messages = []
+#value -> position of its first row, NaN values are left out (they never compare equal)
+def first_positions(values):
+    values = pd.Series(values, dtype=object).dropna()
+    values = values[~values.duplicated()]
+    return dict(zip(values.tolist(), values.index.tolist()))
 
-    # Iterate through each row in the input data
-    for index, row in input_data.iterrows():
-        team = row['Team']
-        color_list = row['Color List']
-
-        # Check if Color List is missing
-        if pd.isna(color_list) or color_list.strip() == "":
-            message = f"Missing Color List for Name: {row['Name']}, Team: {team}"
-            print(message)
-            log_messages.append({"Name": row['Name'], "Team": team, "Message": message})
-            input_data.at[index, 'Parent Color Primary'] = "FAIL"
-            input_data.at[index, 'Item Name Color Primary'] = "FAIL"
-            continue
+#reference rows of one team
+class TeamReference:
+    def __init__(self, parent_colors, positions):
+        self.positions = positions
+        self.parent_colors = parent_colors.iloc[positions]
+        self.choices = self.parent_colors.tolist()
 
-        # Convert Color List to all caps before comparing
-        color_list_upper = color_list.upper()
-
-        # Map the Color List to the New Color using the ColorMappingList
-        color_mapping_row = color_mapping[color_mapping['Color List'] == color_list_upper]
-        if color_mapping_row.empty:
-            message = f"No mapping found for Color List: {color_list_upper}"
-            print(message)
-            log_messages.append({"Name": row['Name'], "Team": team, "Message": message})
-            input_data.at[index, 'Parent Color Primary'] = "FAIL"
-            input_data.at[index, 'Item Name Color Primary'] = "FAIL"
-            continue
+    #position of the first row with this Parent Color Primary
+    def first(self, parent_color):
+        hits = self.positions[(self.parent_colors == parent_color).to_numpy()]
+        if not len(hits):
+            raise IndexError(f"No reference row with Parent Color Primary {parent_color!r}")
+        return hits[0]
+
+#Color List -> first mapping row, and the New Color column those rows point into
+def build_mapping(color_mapping):
+    return first_positions(color_mapping['Color List'].to_numpy(dtype=object)), color_mapping['New Color'].to_numpy(dtype=object)
+
+#reference table and color mapping with every index classify_frame needs, built once per source files
+class CompiledReference:
+    def __init__(self, reference_data, mapping):
+        self.reference_data = reference_data
+        self.mapping = mapping
+        self.mapping_rows, self.new_colors = mapping
+        self.team_rows = reference_data.groupby('Team', sort=False, dropna=True).indices
+
+        # First reference row of every (Team, Parent Color Primary), the right side of the exact-match merge
+        keys = reference_data[['Team', 'Parent Color Primary']].astype(object)
+        keys['_ref_pos'] = np.arange(len(reference_data))
+        keys = keys.dropna(subset=['Team', 'Parent Color Primary'])
+        self.reference_keys = keys.drop_duplicates(['Team', 'Parent Color Primary'])
 
-        new_color = color_mapping_row.iloc[0]['New Color']
+        # Matched values are copied as whole reference rows, the way the old loop read them
+        self.values = reference_data.values
+        self.parent_col = reference_data.columns.get_loc('Parent Color Primary')
+        self.item_col = reference_data.columns.get_loc('Item Name Color Primary')
+        self.parent_colors = reference_data['Parent Color Primary']
 
-        # Filter the reference data for the same team
-        team_reference = reference_data[reference_data['Team'] == team]
+    #the same structure over only some rows of the reference, e.g. a few teams for a worker
+    def subset(self, positions):
+        return CompiledReference(self.reference_data.iloc[positions], self.mapping)
 
-        if team_reference.empty:
-            message = f"No reference data found for Team: {team}"
-            print(message)
-            log_messages.append({"Name": row['Name'], "Team": team, "Message": message})
-            input_data.at[index, 'Parent Color Primary'] = "FAIL"
-            input_data.at[index, 'Item Name Color Primary'] = "FAIL"
+#classify a block of input rows against a reference table
+#returns the Parent Color Primary and Item Name Color Primary columns and {row position: log message}
+def classify_frame(input_data, reference, matcher):
+    n = len(input_data)
+    names = input_data['Name'].to_numpy(dtype=object)
+    teams = input_data['Team'].to_numpy(dtype=object)
+    color_list = pd.Series(input_data['Color List'].to_numpy(dtype=object), dtype=object)
+
+    mapping_rows, new_colors = reference.mapping_rows, reference.new_colors
+    team_rows = reference.team_rows
+
+    parent_out = np.empty(n, dtype=object)
+    item_out = np.empty(n, dtype=object)
+    messages = {}
+
+    def fail(i, message):
+        messages[i] = message
+        parent_out[i] = "FAIL"
+        item_out[i] = "FAIL"
+        metrics.inc("rows_failed")
+
+    # Check if Color List is missing
+    missing = (color_list.isna() | (color_list.str.strip() == "")).to_numpy()
+    for i in np.flatnonzero(missing):
+        fail(i, f"Missing Color List for Name: {names[i]}, Team: {teams[i]}")
+
+    # Convert Color List to all caps and map it to the New Color using the ColorMappingList
+    upper = color_list.str.upper().to_numpy(dtype=object)
+    new_color = np.empty(n, dtype=object)
+    pending = []
+    for i in np.flatnonzero(~missing):
+        if upper[i] not in mapping_rows:
+            fail(i, f"No mapping found for Color List: {upper[i]}")
+            continue
+        new_color[i] = new_colors[mapping_rows[upper[i]]]
+        if teams[i] not in team_rows:
+            fail(i, f"No reference data found for Team: {teams[i]}")
             continue
+        pending.append(i)
+    pending = np.array(pending, dtype=np.intp)
 
-        # Check for a perfect match first
-        if new_color in team_reference['Parent Color Primary'].values:
-            matched_row = team_reference[team_reference['Parent Color Primary'] == new_color].iloc[0]
+    # Exact matches: one merge against the first reference row of every (Team, Parent Color Primary)
+    wanted = pd.DataFrame({'Team': teams[pending], '_new_color': new_color[pending]}, dtype=object)
+    matched = wanted.merge(reference.reference_keys, how='left', left_on=['Team', '_new_color'],
+                           right_on=['Team', 'Parent Color Primary'])['_ref_pos'].to_numpy()
+    exact = ~np.isnan(matched.astype(float))
 
-            # Copy the Parent Color Primary and Item Name Color Primary to the input data
-            input_data.at[index, 'Parent Color Primary'] = matched_row['Parent Color Primary']
-            input_data.at[index, 'Item Name Color Primary'] = matched_row['Item Name Color Primary']
-        else:
-            # If no perfect match, perform fuzzy matching
-            parent_colors = team_reference['Parent Color Primary'].tolist()
-            closest_match, score = process.extractOne(new_color, parent_colors)
+    reference_values, parent_col, item_col = reference.values, reference.parent_col, reference.item_col
+    exact_rows = pending[exact]
+    exact_pos = matched[exact].astype(np.intp)
+    parent_out[exact_rows] = reference_values[exact_pos, parent_col]
+    item_out[exact_rows] = reference_values[exact_pos, item_col]
+    metrics.inc("rows_exact", len(exact_rows))
 
-            if score >= 80:  # Use a threshold of 80 for a good match
+    # If no perfect match, perform fuzzy matching on the rows that are left, one batch per team
+    by_team = {}
+    for i in pending[~exact]:
+        by_team.setdefault(teams[i], []).append(i)
+    for team, rows in by_team.items():
+        team_reference = TeamReference(reference.parent_colors, team_rows[team])
+        matches = matcher.match_many(team, team_reference.choices, [new_color[i] for i in rows])
+        for i in rows:
+            closest_match, score = matches[new_color[i]]
+            if score >= FUZZY_THRESHOLD:
                 # Get the row in the reference data that matches the closest Parent Color Primary
-                matched_row = team_reference[team_reference['Parent Color Primary'] == closest_match].iloc[0]
-
-                # Copy the Parent Color Primary and Item Name Color Primary to the input data
-                input_data.at[index, 'Parent Color Primary'] = matched_row['Parent Color Primary']
-                input_data.at[index, 'Item Name Color Primary'] = matched_row['Item Name Color Primary']
+                pos = team_reference.first(closest_match)
+                parent_out[i] = reference_values[pos, parent_col]
+                item_out[i] = reference_values[pos, item_col]
+                metrics.inc("rows_fuzzy")
             else:
-                message = f"No good match found for New Color: {new_color} in Team: {team}"
-                print(message)
-                log_messages.append({"Name": row['Name'], "Team": team, "Message": message})
-                input_data.at[index, 'Parent Color Primary'] = "FAIL"
-                input_data.at[index, 'Item Name Color Primary'] = "FAIL"
+                fail(i, f"No good match found for New Color: {new_color[i]} in Team: {team}")
+    return parent_out, item_out, messages
+
+#print the messages and build their log rows, in input order
+def log_rows(input_data, messages, quiet=False):
+    names = input_data['Name'].to_numpy(dtype=object)
+    teams = input_data['Team'].to_numpy(dtype=object)
+    log_messages = []
+    for i in sorted(messages):
+        if not quiet:
+            print(messages[i])
+        log_messages.append({"Name": names[i], "Team": teams[i], "Message": messages[i]})
+    return log_messages
+
+# === COMPILED REFERENCE ===
+
+#read and index the reference and mapping CSVs (text=True reads every column as a string)
+def compile_reference(reference_csv, mapping_csv, text=False):
+    dtype = str if text else None
+    return CompiledReference(pd.read_csv(reference_csv, dtype=dtype), build_mapping(pd.read_csv(mapping_csv, dtype=dtype)))
+
+#path of the cached compiled reference for these exact source files
+def compiled_reference_path(reference_csv, mapping_csv, text=False, cache_dir=REFERENCE_CACHE_DIR):
+    key = hashlib.blake2b(digest_size=16)
+    for part in (COMPILED_VERSION, pd.__version__, text, file_hash(reference_csv), file_hash(mapping_csv)):
+        key.update(f"{part}\x1f".encode("utf-8"))
+    return os.path.join(cache_dir, f"reference_{key.hexdigest()}.pkl")
+
+#compiled reference from the cache, compiling and caching it when the source files changed
+def load_compiled_reference(reference_csv, mapping_csv, text=False, cache_dir=REFERENCE_CACHE_DIR):
+    if not cache_dir:
+        return compile_reference(reference_csv, mapping_csv, text)
+    path = compiled_reference_path(reference_csv, mapping_csv, text, cache_dir)
+    if os.path.isfile(path):
+        metrics.inc("reference_cache_hits")
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    metrics.inc("reference_cache_misses")
+    with metrics.timer("compile_reference_ms"):
+        reference = compile_reference(reference_csv, mapping_csv, text)
+    with atomic_write(path, "wb") as f:
+        pickle.dump(reference, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return reference
+
+#classify one input CSV against a compiled reference and write its output and log CSVs
+def classify_file(input_csv, reference, output_csv, log_csv, matcher, quiet=False):
+    input_data = pd.read_csv(input_csv)
+    parent_out, item_out, messages = classify_frame(input_data, reference, matcher)
+    log_messages = log_rows(input_data, messages, quiet)
+
+    input_data['Parent Color Primary'] = parent_out
+    input_data['Item Name Color Primary'] = item_out
 
     # Save the updated input data to the output CSV
     input_data.to_csv(output_csv, index=False)
-    print(f"Updated data saved to {output_csv}")
 
     # Save the log messages to a CSV file
     log_df = pd.DataFrame(log_messages)
     log_df.to_csv(log_csv, index=False)
+    return len(input_data), len(log_messages)
+
+def classify_colors(input_csv, reference_csv, mapping_csv, output_csv, log_csv, fuzzy_cache=FUZZY_CACHE):
+    reference = compile_reference(reference_csv, mapping_csv)
+    matcher = FuzzyMatcher(fuzzy_cache)
+    classify_file(input_csv, reference, output_csv, log_csv, matcher)
+    matcher.save()
+    print(f"Updated data saved to {output_csv}")
+    print(f"Log messages saved to {log_csv}")
+    metrics.report()
+
+# === STREAMING MODE ===
+# the input is read CHUNK_ROWS at a time and split by Team, every team's rows go to a worker process
+# together with only that team's reference rows; output and log rows are appended a chunk at a time in
+# input order and <output>.checkpoint records how far it got, so a rerun after a crash picks up from there
+# every file is read as text so all chunks agree on column types (numbers are written back as they were read)
+
+_worker = {}
+
+def _init_worker(mapping, fuzzy_cache, collect):
+    _worker["mapping"] = mapping
+    _worker["matcher"] = FuzzyMatcher(fuzzy_cache)
+    metrics.enable(collect)
+
+#one team's rows of a chunk: (positions in the chunk, parent column, item column, messages keyed by chunk position)
+def _classify_partition(task, mapping, matcher):
+    positions, rows, reference_data = task
+    parent_out, item_out, messages = classify_frame(rows, CompiledReference(reference_data, mapping), matcher)
+    return positions, parent_out, item_out, {positions[i]: message for i, message in messages.items()}
+
+#in a worker process, also hands back the new fuzzy results and the metrics it recorded
+def _classify_partition_worker(task):
+    metrics.reset()
+    result = _classify_partition(task, _worker["mapping"], _worker["matcher"])
+    return result + (_worker["matcher"].take_added(), metrics.snapshot())
+
+#split a chunk by Team into about `parts` tasks of whole teams, each with only those teams' reference rows
+def _partitions(chunk, reference_data, reference_teams, parts):
+    teams = sorted(chunk.groupby('Team', sort=False, dropna=False).indices.items(), key=lambda t: -len(t[1]))
+    groups = [[] for _ in range(min(parts, len(teams)))]
+    sizes = [0] * len(groups)
+    for team in teams:  # biggest teams first, each into the emptiest group
+        smallest = sizes.index(min(sizes))
+        groups[smallest].append(team)
+        sizes[smallest] += len(team[1])
+    tasks = []
+    for group in groups:
+        positions = np.sort(np.concatenate([rows for _, rows in group]))
+        reference_positions = [reference_teams[team] for team, _ in group if team in reference_teams]
+        reference_positions = np.concatenate(reference_positions) if reference_positions else np.empty(0, dtype=np.intp)
+        tasks.append((positions, chunk.iloc[positions], reference_data.iloc[reference_positions]))
+    return tasks
+
+def _size(path):
+    return os.path.getsize(path) if os.path.isfile(path) else -1
+
+def _load_checkpoint(path, input_csv, chunk_rows, output_csv, log_csv):
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != os.path.abspath(input_csv) or checkpoint.get("chunk_rows") != chunk_rows:
+        return None  # a different run, start over
+    if _size(output_csv) < checkpoint["output_bytes"] or _size(log_csv) < checkpoint["log_bytes"]:
+        return None  # the files it points into are gone or cut short
+    return checkpoint
+
+def _save_checkpoint(path, checkpoint):
+    with atomic_write(path) as f:
+        json.dump(checkpoint, f)
+
+def _append(path, offset, text):
+    with open(path, "r+b" if offset else "wb") as f:
+        f.seek(offset)
+        f.truncate()  # drop anything written after the last checkpoint
+        f.write(text.encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+def classify_colors_streaming(input_csv, reference_csv, mapping_csv, output_csv, log_csv,
+                              chunk_rows=CHUNK_ROWS, workers=WORKERS, fuzzy_cache=FUZZY_CACHE):
+    compiled = load_compiled_reference(reference_csv, mapping_csv, text=True)
+    reference_data, mapping, reference_teams = compiled.reference_data, compiled.mapping, compiled.team_rows
+    parts = (workers or os.cpu_count() or 1) * 4  # partitions per chunk, a few per worker to even out the load
+
+    checkpoint_path = output_csv + ".checkpoint"
+    checkpoint = _load_checkpoint(checkpoint_path, input_csv, chunk_rows, output_csv, log_csv)
+    if checkpoint:
+        print(f"Resuming after {checkpoint['chunks_done']} chunks")
+    else:
+        checkpoint = {"input": os.path.abspath(input_csv), "chunk_rows": chunk_rows,
+                      "chunks_done": 0, "output_bytes": 0, "log_bytes": 0}
+
+    matcher = FuzzyMatcher(fuzzy_cache)
+    pool = None
+    if workers != 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(mapping, fuzzy_cache, metrics.ENABLED))
+    try:
+        for chunk_index, chunk in enumerate(pd.read_csv(input_csv, dtype=str, chunksize=chunk_rows)):
+            if chunk_index < checkpoint["chunks_done"]:
+                continue
+            chunk = chunk.reset_index(drop=True)
+
+            tasks = _partitions(chunk, reference_data, reference_teams, 1 if pool is None else parts)
+
+            parent_out = np.empty(len(chunk), dtype=object)
+            item_out = np.empty(len(chunk), dtype=object)
+            messages = {}
+            if pool is None:
+                results = [_classify_partition(task, mapping, matcher) for task in tasks]
+            else:
+                results = []
+                for *result, added, snapshot in pool.map(_classify_partition_worker, tasks):
+                    matcher.merge(added)
+                    metrics.merge(snapshot)
+                    results.append(result)
+            for positions, parent, item, partition_messages in results:
+                parent_out[positions] = parent
+                item_out[positions] = item
+                messages.update(partition_messages)
+
+            log_messages = log_rows(chunk, messages)
+            chunk['Parent Color Primary'] = parent_out
+            chunk['Item Name Color Primary'] = item_out
+            first_chunk = checkpoint["output_bytes"] == 0
+            checkpoint["output_bytes"] = _append(output_csv, checkpoint["output_bytes"],
+                                                 chunk.to_csv(index=False, header=first_chunk))
+            if log_messages:
+                log_df = pd.DataFrame(log_messages, columns=["Name", "Team", "Message"])
+                checkpoint["log_bytes"] = _append(log_csv, checkpoint["log_bytes"],
+                                                  log_df.to_csv(index=False, header=checkpoint["log_bytes"] == 0))
+            checkpoint["chunks_done"] = chunk_index + 1
+            matcher.save()
+            _save_checkpoint(checkpoint_path, checkpoint)
+            metrics.inc("chunks_done")
+            print(f"Chunk {chunk_index + 1} done ({len(chunk)} rows)")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if checkpoint["output_bytes"] == 0:  # no rows at all, still write the header
+        columns = list(pd.read_csv(input_csv, dtype=str, nrows=0).columns)
+        columns += [c for c in ('Parent Color Primary', 'Item Name Color Primary') if c not in columns]
+        pd.DataFrame(columns=columns).to_csv(output_csv, index=False)
+    if checkpoint["log_bytes"] == 0:  # same as an empty log from classify_colors
+        pd.DataFrame().to_csv(log_csv, index=False)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(f"Updated data saved to {output_csv}")
     print(f"Log messages saved to {log_csv}")
+    metrics.report()
+
+# === BATCH MODE ===
+# many team files in one go: the reference and mapping are compiled once (or loaded from reference_cache/),
+# every worker process loads that compiled copy once and the input files are spread over the workers
+
+OUTPUT_SUFFIXES = ("_output.csv", "_log.csv")
+
+#input CSVs from a directory, a glob pattern or a single path, skipping earlier outputs and logs
+def batch_inputs(pattern):
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.csv")
+    return sorted(p for p in glob.glob(pattern) if not p.endswith(OUTPUT_SUFFIXES))
+
+#<input>_output.csv and <input>_log.csv, next to the input or in output_dir
+def batch_outputs(input_csv, output_dir=None):
+    temp = input_csv.replace(".csv", "")
+    if output_dir:
+        temp = os.path.join(output_dir, os.path.basename(temp))
+    return f"{temp}_output.csv", f"{temp}_log.csv"
+
+def _init_batch_worker(reference_path, fuzzy_cache, collect):
+    with open(reference_path, "rb") as f:
+        _worker["reference"] = pickle.load(f)
+    _worker["matcher"] = FuzzyMatcher(fuzzy_cache)
+    metrics.enable(collect)
+
+def _classify_file_worker(task):
+    input_csv, output_csv, log_csv = task
+    metrics.reset()
+    counts = classify_file(input_csv, _worker["reference"], output_csv, log_csv, _worker["matcher"], quiet=True)
+    return counts, _worker["matcher"].take_added(), metrics.snapshot()
+
+def classify_batch(inputs, reference_csv, mapping_csv, output_dir=None, workers=WORKERS,
+                   fuzzy_cache=FUZZY_CACHE, cache_dir=REFERENCE_CACHE_DIR):
+    input_files = batch_inputs(inputs) if isinstance(inputs, str) else list(inputs)
+    if not input_files:
+        print(f"No input CSVs found for {inputs}")
+        return
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tasks = [(path, *batch_outputs(path, output_dir)) for path in input_files]
+
+    # Workers read the compiled reference from the cache file, so it needs a cache dir
+    cache_dir = cache_dir or REFERENCE_CACHE_DIR
+    reference = load_compiled_reference(reference_csv, mapping_csv, cache_dir=cache_dir)
+    matcher = FuzzyMatcher(fuzzy_cache)
+    if workers == 1 or len(tasks) == 1:
+        for task in tasks:
+            rows, failed = classify_file(task[0], reference, task[1], task[2], matcher, quiet=True)
+            print(f"{task[0]}: {rows} rows, {failed} logged -> {task[1]}")
+    else:
+        reference_path = compiled_reference_path(reference_csv, mapping_csv, cache_dir=cache_dir)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(reference_path, fuzzy_cache, metrics.ENABLED)) as pool:
+            futures = {pool.submit(_classify_file_worker, task): task for task in tasks}
+            for future in as_completed(futures):
+                task = futures[future]
+                (rows, failed), added, snapshot = future.result()
+                matcher.merge(added)
+                metrics.merge(snapshot)
+                print(f"{task[0]}: {rows} rows, {failed} logged -> {task[1]}")
+    matcher.save()
+    metrics.inc("batch_files", len(tasks))
+    print(f"Classified {len(tasks)} files")
+    metrics.report()
 
 # Example usage
+# python team_color_classifier.py [input csv | directory | "glob/*.csv"]
 if __name__ == "__main__":
     input_csv = "iowa_state_test.csv"  # Replace with the path to the first CSV
-    temp = input_csv.replace(".csv", "")
     reference_csv = "BuyerParentColorView.csv"  # Replace with the path to the second CSV
     mapping_csv = "ColorMappingList.csv"  # Replace with the path to the color mapping CSV
-    output_csv = f"{temp}_output.csv"  # Replace with the desired output file path
-    log_csv = f"{temp}_log.csv"  # File to save log messages
+    if len(sys.argv) > 1:
+        input_csv = sys.argv[1]
 
-    classify_colors(input_csv, reference_csv, mapping_csv, output_csv, log_csv)
\ No newline at end of file
+    if os.path.isdir(input_csv) or glob.has_magic(input_csv):
+        classify_batch(input_csv, reference_csv, mapping_csv)
+    else:
+        output_csv, log_csv = batch_outputs(input_csv)  # <input>_output.csv and <input>_log.csv
+        classify_colors(input_csv, reference_csv, mapping_csv, output_csv, log_csv)
@@ -1,73 +1,52 @@
-import joblib
+import csv
 import os
-import cv2
-import numpy as np
-import pandas as pd
+from features import extract_features, extract_features_parallel, model_feature_settings
+from inference import BATCH_SIZE, predict_batch
+from lut import ColorLUT
+from model_format import load_model
+import metrics
 
 os.environ["LOKY_MAX_CPU_COUNT"] = "10"
 
-#load the model
-knn_loaded = joblib.load("gray_model.pkl")
-print("Model loaded successfully!")
+#feature extraction processes for folder runs (None = one per core)
+WORKERS = None
 
-#how to calc mean image color
-def extract_color_features(image_path):
-    image = cv2.imread(image_path)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) #RGB conversion func
-    mean_color = np.mean(image, axis=(0, 1)) #mean the color values
-    return mean_color
+#rows per batched prediction
+PREDICT_BATCH = BATCH_SIZE
 
-#calc mean color without white pixels
-def extract_color_features_nw(image_path):
-    image = cv2.imread(image_path)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)  #convert to RGB
+#model to load: mapped model directory from classifier.py, a joblib pickle,
+#or a table made by lut.py (e.g. "gray_model.lut6.npz") to classify by lookup instead of KNN
+MODEL_PATH = "gray_model"
 
-    #create a mask for non-white pixels
-    mask = ~(np.all(image == [255, 255, 255], axis=-1))
-
-    #extract non-white pixels to mask
-    non_white_pixels = image[mask]
-
-    #compute mean color
-    if len(non_white_pixels) > 0:
-        mean_color = np.mean(non_white_pixels, axis=0)
-    else:
-        mean_color = [0, 0, 0]  #default to black if no valid pixels
-
-    return mean_color
-
-
-#how to get central pixel color value
-def get_center_pixel_color(image_path):
-    image = cv2.imread(image_path) 
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-    height, width, _ = image.shape
-    center_x, center_y = width // 2, height // 2 
-
-    center_pixel = image[center_y, center_x]
-    return center_pixel
-
-#ONLY CHOOSE ONE OF THE ABOVE METHODS (just func defs above here though)
+#labels for an (N, 3) feature array, from a KNN model or a compiled lookup table
+def predict_labels(model, features):
+    metrics.inc("predictions", len(features))
+    with metrics.timer("predict_ms"):
+        if isinstance(model, ColorLUT):
+            return model.predict(features)
+        return predict_batch(model, features, PREDICT_BATCH).labels
 
 def predict_color(image_path, model):
-    center_color = extract_color_features_nw(image_path).reshape(1, -1)  # Reshape for prediction
-    predicted_label = model.predict(center_color)
+    method, scale = model_feature_settings(model)  #decode the same way the model was trained
+    center_color = extract_features(image_path, method, scale).reshape(1, -1)  # Reshape for prediction
+    predicted_label = predict_labels(model, center_color)
     return predicted_label[0]
 
 def process_images_from_folder(folder_path, model, output_file):
     image_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.lower().endswith(('jpeg', 'jpg'))]
-    results = []
-    
-    for image_path in image_files:
-        print(f"Processing image: {image_path}")
-        image_name = os.path.basename(image_path)
-        image_name = image_name.partition('.')[0]
-        predicted_color = predict_color(image_path, model)
-        results.append((image_name, predicted_color))
-    
-    df = pd.DataFrame(results, columns=["Name", "Predicted Color"])
-    df.to_csv(output_file, index=False)
+    print(f"Processing {len(image_files)} images from {folder_path}")
+    method, scale = model_feature_settings(model)
+    features = extract_features_parallel(image_files, method, workers=WORKERS, scale=scale)
+    predicted_colors = predict_labels(model, features)
+
+    #plain csv writer, pandas is a slow import for a small run
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Predicted Color"])
+        for image_path, predicted_color in zip(image_files, predicted_colors):
+            image_name = os.path.basename(image_path)
+            image_name = image_name.partition('.')[0]
+            writer.writerow([image_name, predicted_color])
     print(f"Results saved to {output_file}")
 
 ###########################################
@@ -79,6 +58,13 @@ def process_images_from_folder(folder_path, model, output_file):
 #single image test ^^^^^^^^
 #multi image test vvvvvvvv
 
-image_folder = "gray_images/"  
-output_csv = "gray_predictions.csv"
-process_images_from_folder(image_folder, knn_loaded, output_csv)
+def main(image_folder="gray_images/", output_csv="gray_predictions.csv", model_path=MODEL_PATH):
+    #load the model
+    knn_loaded = load_model(model_path)
+    print("Model loaded successfully!")
+
+    process_images_from_folder(image_folder, knn_loaded, output_csv)
+    metrics.report()
+
+if __name__ == "__main__":
+    main()